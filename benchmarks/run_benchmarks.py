@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+from functools import partial
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import generate, as_loaded, write_workbook, EXCEL_MAX_ROWS
+from logic.data_loader import DataLoader
+from logic.data_cleaner import DataCleaner
+from logic.data_processor import DataProcessor
+from logic.charts import ChartRenderer, _render_job, _load_plotting
+from logic.report_generator import ReportGenerator
+
+DEFAULT_ROWS = "100000,1000000,10000000,50000000"
+
+
+class TimedRenderer(ChartRenderer):
+    # Renders in-process, one chart at a time, recording each chart's time
+    def __init__(self, timings):
+        super().__init__(max_workers=1)
+        self.timings = timings
+
+    def _render_all(self, jobs):
+        results = {}
+        for key, job in jobs.items():
+            start = time.perf_counter()
+            results[key] = _render_job(*job)
+            self.timings[f"chart:{key}"] = time.perf_counter() - start
+        return results
+
+
+def _timed(stages, name, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    stages[name] = time.perf_counter() - start
+    print(f"  {name:<40}{stages[name]:>10.3f}s")
+    return result
+
+
+def run_size(rows, args):
+    print(f"▶ {rows:,} rows")
+    stages = {}
+    raw = _timed(stages, "generate", partial(generate, rows, cancel_rate=args.cancel_rate))
+
+    if rows <= min(args.max_excel_rows, 2 * EXCEL_MAX_ROWS):
+        path = os.path.abspath("online_retail_II.xlsx")
+        write_workbook(raw, path)
+        loaded = _timed(stages, "sheet_load", DataLoader(path, max_workers=args.workers).load)
+    else:
+        print(f"  {'sheet_load':<40}{'skipped':>11}")
+        # Cleaning is timed on the loader's dtypes, as in production
+        loaded = as_loaded(raw)
+    del raw
+
+    df = _timed(stages, "clean", DataCleaner(verbose=False).clean, loaded)
+    final_count = df['Invoice'].count()
+    del loaded
+
+    # Chart timings should not include importing matplotlib and seaborn
+    _load_plotting()
+
+    dp = DataProcessor(df, renderer=TimedRenderer(stages))
+    data_l1 = _timed(stages, "level_1", dp._handle_level_1, final_count)
+    data_l2 = _timed(stages, "level_2", dp._handle_level_2)
+    data_l3 = _timed(stages, "level_3", dp._handle_level_3)
+    for key in [k for k in stages if k.startswith("chart:")]:
+        print(f"    {key:<38}{stages[key]:>10.3f}s")
+
+    rg = ReportGenerator()
+    _timed(stages, "report_level_1", rg.generate_level_1_report, data_l1, "Level1_Report.pdf")
+    _timed(stages, "report_level_2", rg.generate_level_2_report, data_l1, data_l2, "Level2_Report.pdf")
+    _timed(stages, "report_level_3", rg.generate_level_3_report, data_l1, data_l2, data_l3,
+           "Level3_Report.pdf")
+    return {"rows": rows, "final_rows": int(final_count), "stages": stages}
+
+
+def compare(results, baseline, tolerance, min_delta):
+    # A stage regresses when it is both relatively and absolutely slower
+    base_runs = {run["rows"]: run["stages"] for run in baseline["runs"]}
+    regressions = []
+    print(f"\n{'rows':>12}  {'stage':<40}{'baseline':>10}{'current':>10}{'change':>9}")
+    for run in results["runs"]:
+        base = base_runs.get(run["rows"])
+        if base is None:
+            continue
+        for stage, seconds in run["stages"].items():
+            if stage not in base:
+                continue
+            before = base[stage]
+            change = seconds / before - 1 if before else 0.0
+            flag = ""
+            if change > tolerance and seconds - before > min_delta:
+                regressions.append((run["rows"], stage))
+                flag = "  ❌"
+            print(f"{run['rows']:>12,}  {stage:<40}{before:>10.3f}{seconds:>10.3f}{change:>+9.0%}{flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on synthetic data")
+    parser.add_argument("--rows", default=DEFAULT_ROWS,
+                        help=f"comma-separated dataset sizes (default: {DEFAULT_ROWS})")
+    parser.add_argument("--cancel-rate", type=float, default=0.02,
+                        help="share of invoices that are cancellations (default: 0.02)")
+    parser.add_argument("--max-excel-rows", type=int, default=1_000_000,
+                        help="only time sheet loading up to this many rows, since writing "
+                             "the workbook is slow (default: 1000000)")
+    parser.add_argument("--workers", type=int, help="processes for sheet loading")
+    parser.add_argument("--out", default="benchmark_results.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative slowdown per stage (default: 0.2)")
+    parser.add_argument("--min-delta", type=float, default=0.05,
+                        help="ignore slowdowns smaller than this many seconds (default: 0.05)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.rows.split(",")]
+    out_path = os.path.abspath(args.out)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    results = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count()
+        },
+        "runs": []
+    }
+    # Charts and PDFs are written under assets/ relative to the working
+    # directory, so every run happens in a scratch directory
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            os.makedirs("assets", exist_ok=True)
+            for rows in sizes:
+                results["runs"].append(run_size(rows, args))
+        finally:
+            os.chdir(cwd)
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results written to {out_path}")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print(f"\n❌ {len(regressions)} stage(s) regressed beyond {args.tolerance:.0%}")
+            return 1
+        print("\n✅ No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
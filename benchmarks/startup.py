@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import generate, write_workbook
+from benchmarks.run_benchmarks import compare
+
+MAIN = os.path.join(ROOT, "main.py")
+
+# Modules that should not be imported before a chart or PDF is built
+HEAVY_MODULES = ("matplotlib", "seaborn", "reportlab", "scipy")
+
+# Start-up cost of main.py, each measured in a fresh interpreter:
+#   import_main          in-process time of `import main`
+#   process_import_main  wall time of `python -c "import main"`
+#   menu_cold_cache      launch to menu when the workbook must be parsed
+#   menu_warm_cache      launch to menu when the dataset cache is fresh
+#   level_1_report       menu option 1 until its PDF is written
+
+
+def _import_main():
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1]), time.perf_counter() - start
+
+
+def _wait_for(process, text):
+    for line in process.stdout:
+        if text in line:
+            return
+    raise RuntimeError(f"main.py exited before printing '{text}'")
+
+
+def _menu_session(workdir, level_1=False, import_log=None):
+    # Launches the interactive menu and returns (seconds to menu, seconds
+    # for a level-1 report or None). With import_log, -X importtime output
+    # is written there.
+    command = [sys.executable, "-u"] + (["-X", "importtime"] if import_log else []) + [MAIN]
+    with open(import_log or os.devnull, "w") as stderr:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=workdir, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=stderr, text=True)
+        try:
+            _wait_for(process, "Select option from the list")
+            to_menu = time.perf_counter() - start
+            level_1_seconds = None
+            if level_1:
+                start = time.perf_counter()
+                process.stdin.write("1\n")
+                process.stdin.flush()
+                _wait_for(process, "Level 1 PDF report generated")
+                level_1_seconds = time.perf_counter() - start
+            process.stdin.write("q\n")
+            process.stdin.flush()
+            process.communicate(timeout=60)
+        finally:
+            if process.poll() is None:
+                process.kill()
+    return to_menu, level_1_seconds
+
+
+def _imported_modules(import_log):
+    # Top-level packages listed in -X importtime output
+    modules = set()
+    with open(import_log) as f:
+        for line in f:
+            if "|" in line and not line.rstrip().endswith("imported package"):
+                modules.add(line.rsplit("|", 1)[1].strip().split(".")[0])
+    return modules
+
+
+def run_startup(rows, repeats):
+    print(f"▶ start-up with a {rows:,}-row workbook")
+    stages = {}
+    imports = [_import_main() for _ in range(repeats)]
+    stages["import_main"] = statistics.median(seconds for seconds, _ in imports)
+    stages["process_import_main"] = statistics.median(seconds for _, seconds in imports)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_workbook(generate(rows), os.path.join(workdir, "online_retail_II.xlsx"))
+        stages["menu_cold_cache"], _ = _menu_session(workdir)
+        sessions = [_menu_session(workdir, level_1=True) for _ in range(repeats)]
+        stages["menu_warm_cache"] = statistics.median(to_menu for to_menu, _ in sessions)
+        stages["level_1_report"] = statistics.median(level_1 for _, level_1 in sessions)
+
+        import_log = os.path.join(workdir, "importtime.log")
+        _menu_session(workdir, import_log=import_log)
+        heavy = sorted(set(HEAVY_MODULES) & _imported_modules(import_log))
+
+    for name, seconds in stages.items():
+        print(f"  {name:<40}{seconds:>10.3f}s")
+    print(f"  {'heavy modules at the menu':<40}{', '.join(heavy) or 'none':>11}")
+    return {"rows": rows, "stages": stages, "heavy_modules_at_menu": heavy}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time main.py start-up: imports and first menu")
+    parser.add_argument("--rows", type=int, default=20_000,
+                        help="rows in the synthetic workbook (default: 20000)")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="launches per measurement; the median is reported (default: 5)")
+    parser.add_argument("--out", default="startup_results.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative slowdown per stage (default: 0.2)")
+    parser.add_argument("--min-delta", type=float, default=0.05,
+                        help="ignore slowdowns smaller than this many seconds (default: 0.05)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count()
+        },
+        "runs": [run_startup(args.rows, args.repeats)]
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results written to {os.path.abspath(args.out)}")
+
+    status = 0
+    heavy = results["runs"][0]["heavy_modules_at_menu"]
+    if heavy:
+        print(f"\n❌ Imported before any report was requested: {', '.join(heavy)}")
+        status = 1
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print(f"\n❌ {len(regressions)} stage(s) regressed beyond {args.tolerance:.0%}")
+            status = 1
+        else:
+            print("\n✅ No regressions against the baseline")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+from logic.data_loader import COLUMN_DTYPES
+
+# Excel's sheet row limit, minus the header row
+EXCEL_MAX_ROWS = 1_048_575
+
+COUNTRIES = [
+    "United Kingdom", "EIRE", "Germany", "France", "Netherlands", "Spain", "Switzerland",
+    "Belgium", "Portugal", "Australia", "Sweden", "Italy", "Channel Islands", "Norway",
+    "Finland", "Denmark", "Austria", "Japan", "Cyprus", "Poland", "Greece", "Israel",
+    "USA", "Singapore", "Canada", "Iceland", "Malta", "Unspecified", "Lithuania",
+    "United Arab Emirates", "Bahrain", "Hong Kong", "Czech Republic", "Brazil", "RSA",
+    "Lebanon", "Korea", "European Community"
+]
+
+
+def generate(rows, countries=38, products=4_000, customers=5_900, cancel_rate=0.02,
+             null_customer_rate=0.2, zero_price_rate=0.005, lines_per_invoice=20, seed=0,
+             start="2009-12-01", end="2011-12-09"):
+    # Seeded frame shaped like the raw Online Retail II sheets. Text columns
+    # are categoricals so that tens of millions of rows fit in memory; use
+    # as_loaded() for the dtypes DataLoader actually produces.
+    rng = np.random.default_rng(seed)
+    n_invoices = max(1, rows // lines_per_invoice)
+    countries = min(countries, len(COUNTRIES))
+
+    # Invoices are numbered in date order, and each line belongs to one invoice
+    invoice_of_row = np.sort(rng.integers(0, n_invoices, rows))
+    invoice_numbers = np.arange(489_434, 489_434 + n_invoices).astype(str)
+    cancelled = rng.random(n_invoices) < cancel_rate
+    invoice_labels = np.where(cancelled, np.char.add("C", invoice_numbers), invoice_numbers)
+
+    span = (pd.Timestamp(end) - pd.Timestamp(start)).total_seconds()
+    invoice_dates = pd.Timestamp(start) + pd.to_timedelta(
+        np.sort(rng.random(n_invoices)) * span, unit="s").round("min")
+
+    # Customer of each invoice (some unknown), and the customer's country;
+    # a skewed distribution so the UK dominates as in the real data
+    customer_ids = np.arange(12_346, 12_346 + customers)
+    country_weights = 1 / np.arange(1, countries + 1) ** 2
+    customer_country = rng.choice(countries, customers, p=country_weights / country_weights.sum())
+    invoice_customer = rng.integers(0, customers, n_invoices)
+    unknown = rng.random(n_invoices) < null_customer_rate
+
+    # Product popularity follows a Zipf-like curve
+    product_weights = 1 / np.arange(1, products + 1)
+    product_of_row = rng.choice(products, rows, p=product_weights / product_weights.sum())
+    product_prices = np.round(rng.lognormal(0.8, 0.9, products), 2) + 0.1
+    stock_codes = np.arange(10_000, 10_000 + products).astype(str)
+    descriptions = np.char.add("SYNTHETIC PRODUCT ", stock_codes)
+
+    quantity = rng.geometric(0.15, rows).astype(np.int64)
+    quantity[cancelled[invoice_of_row]] *= -1
+    price = product_prices[product_of_row]
+    price[rng.random(rows) < zero_price_rate] = 0.0
+
+    row_customer = invoice_customer[invoice_of_row]
+    customer_id = customer_ids[row_customer].astype(np.float64)
+    customer_id[unknown[invoice_of_row]] = np.nan
+
+    return pd.DataFrame({
+        "Invoice": pd.Categorical.from_codes(invoice_of_row, invoice_labels),
+        "StockCode": pd.Categorical.from_codes(product_of_row, stock_codes),
+        "Description": pd.Categorical.from_codes(product_of_row, descriptions),
+        "Quantity": quantity,
+        "InvoiceDate": invoice_dates[invoice_of_row],
+        "Price": price,
+        "Customer ID": customer_id,
+        "Country": pd.Categorical.from_codes(customer_country[row_customer], COUNTRIES[:countries])
+    })
+
+
+def as_loaded(df):
+    # The frame with DataLoader's dtypes (plain strings for text columns).
+    # Cleaning takes a faster path for categoricals, so timings of the clean
+    # stage must start from this.
+    return df.astype(COLUMN_DTYPES)
+
+
+def write_workbook(df, path, sheets=("Year 2009-2010", "Year 2010-2011")):
+    # Splits the rows across the two sheet names the loader expects
+    per_sheet = -(-len(df) // len(sheets))
+    if per_sheet > EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(df):,} rows do not fit in {len(sheets)} Excel sheets")
+    with pd.ExcelWriter(path) as writer:
+        for i, sheet in enumerate(sheets):
+            df.iloc[i * per_sheet:(i + 1) * per_sheet].to_excel(writer, sheet_name=sheet, index=False)
+    return path
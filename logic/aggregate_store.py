@@ -0,0 +1,253 @@
+import os
+import json
+import glob
+import numpy as np
+import pandas as pd
+from logic.data_cache import DatasetCache
+from logic.data_cleaner import DataCleaner
+from logic.data_loader import _read_source
+from logic.streaming import PartialAggregates, iter_chunks, CELL_KEYS
+
+LEDGER_KEYS = ['Customer ID', 'StockCode']
+
+
+class AggregateStore:
+    # Persistent, partitioned copy of PartialAggregates that is refreshed
+    # from append-only delta files. Month x Country x Description cells live
+    # in one Parquet file per month, so a daily delta rewrites only the months
+    # it touches. A ledger of the cells in which each customer bought each
+    # StockCode, with the dates and quantity of those sales, lets 'C'
+    # cancellation invoices take revenue back out of the partition of the
+    # sale they refer to.
+    # An ingest is atomic: every file it changes is first written next to its
+    # target as <name>.tmp, then a journal listing them is renamed into place
+    # as the commit point, and only then are the files moved over their
+    # targets. A store opened after a crash finishes a committed ingest or
+    # discards the files of one that never committed, so a retried delta is
+    # never counted twice.
+    def __init__(self, root=".cache/aggregates", sample_size=200_000):
+        self.root = root
+        self.sample_size = sample_size
+        self.cells_dir = os.path.join(root, "cells")
+        self.meta_path = os.path.join(root, "meta.json")
+        self.journal_path = os.path.join(root, "commit.json")
+        os.makedirs(self.cells_dir, exist_ok=True)
+        self._recover()
+
+    def _path(self, name):
+        return os.path.join(self.root, f"{name}.parquet")
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"initial_count": 0, "final_count": 0, "n": 0,
+                    "mean": [0.0] * 3, "comoment": [[0.0] * 3] * 3, "ingested": {}}
+
+    # The _write_* methods below stage a file and return the path it
+    # replaces once _commit is called
+
+    def _write_meta(self, meta):
+        with open(self.meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        return self.meta_path
+
+    def _read_frame(self, name):
+        path = self._path(name)
+        return pd.read_parquet(path) if os.path.exists(path) else None
+
+    def _write_frame(self, name, df):
+        df.to_parquet(self._path(name) + ".tmp", index=False)
+        return self._path(name)
+
+    def _read_month(self, month):
+        path = os.path.join(self.cells_dir, f"{month}.parquet")
+        if not os.path.exists(path):
+            return None
+        return pd.read_parquet(path).set_index(CELL_KEYS[1:])
+
+    def _write_month(self, month, cells):
+        path = os.path.join(self.cells_dir, f"{month}.parquet")
+        cells.reset_index().to_parquet(path + ".tmp", index=False)
+        return path
+
+    def _commit(self, paths):
+        # Renaming the journal into place commits the ingest
+        with open(self.journal_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(paths, f)
+        os.replace(self.journal_path + ".tmp", self.journal_path)
+        self._recover()
+
+    def _recover(self):
+        # Moves the files of a committed ingest into place (again, after a
+        # crash), then removes files staged by an ingest that did not commit
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as f:
+                paths = json.load(f)
+            for path in paths:
+                if os.path.exists(path + ".tmp"):
+                    os.replace(path + ".tmp", path)
+            os.remove(self.journal_path)
+        for tmp_path in glob.glob(os.path.join(self.root, "*.tmp")) + glob.glob(os.path.join(self.cells_dir, "*.tmp")):
+            os.remove(tmp_path)
+
+    @staticmethod
+    def _read_delta(path):
+        if path.lower().endswith((".csv", ".parquet")):
+            raw = pd.concat(iter_chunks(path), ignore_index=True)
+        else:
+            with pd.ExcelFile(path) as book:
+                sheets = book.sheet_names
+            raw = pd.concat([_read_source(path, sheet) for sheet in sheets], ignore_index=True)
+        raw.columns = raw.columns.str.strip()
+        return raw
+
+    def _cancellation_cells(self, raw, ledger):
+        # Cancellation lines carry a negative quantity; each is netted out of
+        # the month/country/product cell of the customer's most recent sale
+        # of the same StockCode on or before the cancellation date, up to the
+        # quantity that cell still has. Returns the cell adjustments, the
+        # number of lines netted and the ledger with those quantities taken
+        # off.
+        invoice = raw['Invoice'].astype(str)
+        cancelled = raw[invoice.str.startswith('C') & raw['Customer ID'].notna()
+                        & (raw['Quantity'] < 0) & (raw['Price'] > 0)]
+        if cancelled.empty or ledger is None:
+            return None, 0, ledger
+        cancelled = pd.DataFrame({
+            'Customer ID': cancelled['Customer ID'].astype(np.int64),
+            'StockCode': cancelled['StockCode'].astype(str),
+            'InvoiceDate': pd.to_datetime(cancelled['InvoiceDate']).astype('datetime64[ns]'),
+            'Price': cancelled['Price'].astype(np.float64),
+            'Returned': -cancelled['Quantity'].astype(np.int64)
+        })
+        cancelled['Line'] = np.arange(len(cancelled))
+        cells = ledger.rename(columns={'Quantity': 'Sold'}).rename_axis('Cell').reset_index()
+        candidates = cancelled.merge(cells, on=LEDGER_KEYS)
+        candidates = candidates[candidates['FirstSale'] <= candidates['InvoiceDate']]
+        if candidates.empty:
+            return None, 0, ledger
+        # A cell's latest sale not after the cancellation is its last sale
+        # when that is earlier; otherwise the first sale is a lower bound
+        latest = candidates['LastSale'].where(candidates['LastSale'] <= candidates['InvoiceDate'],
+                                              candidates['FirstSale'])
+        matched = (candidates.assign(Latest=latest).sort_values('Latest', kind='stable')
+                   .drop_duplicates('Line', keep='last').sort_values(['InvoiceDate', 'Line']))
+        # Cancellations of a cell are netted in date order until its sold
+        # quantity is used up; returns beyond that are dropped
+        by_cell = matched.groupby('Cell')
+        taken = np.minimum(by_cell['Returned'].cumsum(), matched['Sold'].clip(lower=0))
+        netted = taken - taken.groupby(matched['Cell']).shift(fill_value=0)
+        matched = matched.assign(Quantity=-netted, Revenue=-netted * matched['Price'])
+        matched = matched[netted > 0]
+        if matched.empty:
+            return None, 0, ledger
+        ledger = ledger.copy()
+        used = matched.groupby('Cell')['Quantity'].sum()
+        ledger.loc[used.index, 'Quantity'] += used.to_numpy()
+        adjustments = matched[CELL_KEYS + ['Revenue', 'Quantity']].assign(Lines=0)
+        return adjustments.groupby(CELL_KEYS).sum(), len(matched), ledger
+
+    def ingest(self, path):
+        # Returns the number of month partitions rewritten
+        meta = self._read_meta()
+        digest = DatasetCache._file_hash(path)
+        if digest in meta["ingested"]:
+            print(f"⏭️  {path} was already ingested")
+            return 0
+
+        raw = self._read_delta(path)
+        sales = DataCleaner(verbose=False).clean(raw)
+        rng = np.random.default_rng(len(meta["ingested"]))
+        delta = PartialAggregates.from_clean(sales, int(raw['Invoice'].count()), rng, self.sample_size)
+
+        staged = []
+        # First and last sale and the quantity not yet cancelled per
+        # customer, product and cell, for matching cancellations in this and
+        # later deltas
+        ledger = self._read_frame("ledger")
+        if ledger is not None and not {'FirstSale', 'LastSale', 'Quantity'} <= set(ledger.columns):
+            raise ValueError(f"aggregate store '{self.root}' was built by an older version; "
+                             "delete it and ingest the deltas again")
+        if not sales.empty:
+            new_ledger = pd.DataFrame({
+                'Customer ID': sales['Customer ID'].astype(np.int64),
+                'StockCode': sales['StockCode'].astype(str),
+                'Month': sales['InvoiceDate'].dt.to_period('M').astype(str),
+                'Country': sales['Country'].astype(str),
+                'Description': sales['Description'].astype(str),
+                'FirstSale': sales['InvoiceDate'],
+                'LastSale': sales['InvoiceDate'],
+                'Quantity': sales['Quantity'].astype(np.int64)
+            })
+            if ledger is not None:
+                new_ledger = pd.concat([ledger, new_ledger], ignore_index=True)
+            ledger = new_ledger.groupby(LEDGER_KEYS + CELL_KEYS, as_index=False).agg(
+                FirstSale=('FirstSale', 'min'), LastSale=('LastSale', 'max'), Quantity=('Quantity', 'sum'))
+
+        cells = delta.cells
+        adjustments, n_cancelled, ledger = self._cancellation_cells(raw, ledger)
+        if adjustments is not None:
+            cells = pd.concat([cells, adjustments]).groupby(level=CELL_KEYS).sum()
+        if not sales.empty or adjustments is not None:
+            staged.append(self._write_frame("ledger", ledger))
+
+        # Only the months present in the delta are read and rewritten
+        touched = cells.index.get_level_values('Month').unique()
+        for month in touched:
+            month_cells = cells.xs(month, level='Month')
+            existing = self._read_month(month)
+            if existing is not None:
+                month_cells = existing.add(month_cells, fill_value=0)
+            staged.append(self._write_month(month, month_cells.astype({'Lines': 'int64'})))
+
+        total = self._load_summary(meta)
+        total.merge(delta)
+        for name, values in (("invoices", total.invoices), ("customers", total.customers)):
+            staged.append(self._write_frame(name, pd.DataFrame({name: values})))
+        if total.sample is not None:
+            staged.append(self._write_frame("sample", total.sample))
+
+        meta.update({
+            "initial_count": total.initial_count,
+            "final_count": total.final_count,
+            "n": total.n,
+            "mean": total.mean.tolist(),
+            "comoment": total.comoment.tolist()
+        })
+        meta["ingested"][digest] = os.path.abspath(path)
+        # meta, with the delta's digest, is moved into place last
+        staged.append(self._write_meta(meta))
+        self._commit(staged)
+        print(f"📥 Ingested {path}: {len(touched)} month partition(s) updated, "
+              f"{n_cancelled} cancellation line(s) netted")
+        return len(touched)
+
+    def _load_summary(self, meta=None):
+        # Everything except the cells, which are only needed to build reports
+        meta = meta or self._read_meta()
+        total = PartialAggregates(self.sample_size)
+        total.initial_count = meta["initial_count"]
+        total.final_count = meta["final_count"]
+        total.n = meta["n"]
+        total.mean = np.array(meta["mean"])
+        total.comoment = np.array(meta["comoment"])
+        invoices = self._read_frame("invoices")
+        customers = self._read_frame("customers")
+        if invoices is not None:
+            total.invoices = invoices["invoices"].to_numpy(dtype=object)
+        if customers is not None:
+            total.customers = customers["customers"].to_numpy(dtype=np.int64)
+        total.sample = self._read_frame("sample")
+        return total
+
+    def load(self):
+        total = self._load_summary()
+        months = []
+        for path in sorted(glob.glob(os.path.join(self.cells_dir, "*.parquet"))):
+            month = os.path.splitext(os.path.basename(path))[0]
+            months.append(pd.read_parquet(path).assign(Month=month))
+        if months:
+            total.cells = pd.concat(months, ignore_index=True).set_index(CELL_KEYS)
+        return total
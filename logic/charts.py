@@ -0,0 +1,313 @@
+import io
+import os
+import time
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from logic import profiler
+
+# Each chart is a module-level function taking only the small aggregated
+# input it plots, so it can be shipped to a worker process. Charts are built
+# on their own Figure object rather than through pyplot's global state, and
+# the renderer encodes the returned figure.
+# matplotlib and seaborn take most of a second to import, so they are loaded
+# (and the theme applied) when the first chart is drawn, not at start-up.
+
+# Part of every plot cache key: bump it when the drawing code below changes
+# so previously cached images are rendered again
+CHART_VERSION = 1
+
+# Formats ReportLab can embed
+IMAGE_FORMATS = ("png", "jpg")
+
+Figure = None
+sns = None
+
+
+def _load_plotting():
+    # Loads the plotting libraries into this module; a no-op once loaded
+    global Figure, sns
+    if sns is None:
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib.figure import Figure
+        import seaborn as sns
+        sns.set_theme(style="darkgrid")
+
+
+def _uses_plotting(func):
+    # Chart functions load the plotting libraries on their first call, so
+    # they also work when called directly rather than through _render_job
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _load_plotting()
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _encode(fig, image_format="png", dpi=None):
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=image_format, dpi=dpi or "figure")
+    return buffer.getvalue()
+
+
+def _write(image, path):
+    # Write to a temporary file and rename, so a file that is hard-linked
+    # into the plot cache is replaced rather than overwritten in place
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.{os.getpid()}.tmp{ext}"
+    with open(tmp_path, "wb") as f:
+        f.write(image)
+    os.replace(tmp_path, path)
+    return path
+
+
+@_uses_plotting
+def country_revenue_chart(country_revenue, figsize=(10, 6), palette='crest'):
+    # Convert Series to DataFrame
+    country_df = country_revenue.reset_index()
+    country_df.columns = ['Country', 'Revenue']
+
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
+    colors = sns.color_palette(palette, n_colors=len(country_df))
+    sns.barplot(data=country_df, x='Country', y='Revenue', palette=colors, hue='Country', legend=False, ax=ax)
+    # Add labels on top of bars
+    for p in ax.patches:
+        height = p.get_height()
+        ax.annotate(f'{height:,.0f}',
+                    (p.get_x() + p.get_width() / 2., height),
+                    ha='center', va='bottom', fontsize=8, color='black')
+
+    ax.set_title("Top 10 Countries by Revenue")
+    ax.set_xlabel("Country")
+    ax.set_ylabel("Revenue")
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(axis='y')
+    return fig
+
+
+@_uses_plotting
+def monthly_revenue_chart(monthly_revenue, figsize=(12, 6), color='green'):
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
+    ax.plot(monthly_revenue.index, monthly_revenue.values, marker='o', linestyle='-', color=color, label="Revenue")
+    # Add data labels
+    for x, y in zip(monthly_revenue.index, monthly_revenue.values):
+        ax.text(x, y + 1000, f'{y:,.0f}', ha='center', va='bottom', fontsize=8, color='black')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.set_title('Monthly Revenue Over Time')
+    ax.set_xlabel('Year-Month')
+    ax.set_ylabel('Revenue')
+    ax.grid(True)
+    return fig
+
+
+@_uses_plotting
+def product_quantity_chart(product_quantity, figsize=(10, 6), palette='crest'):
+    product_df = product_quantity.reset_index()
+    product_df.columns = ['Product', 'Quantity']
+    product_df['Product'] = product_df['Product'].str.slice(0, 40) + '...'
+
+    # Bar plot (horizontal for better label fit)
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
+    colors = sns.color_palette(palette, n_colors=len(product_df))
+    sns.barplot(data=product_df, x='Quantity', y='Product', palette=colors, hue='Product', legend=False, ax=ax)
+    # Add labels to end of bars
+    for p in ax.patches:
+        width = p.get_width()
+        ax.annotate(f'{width:,.0f}',
+                    (width + 10, p.get_y() + p.get_height() / 2),
+                    ha='left', va='center', fontsize=8, color='black')
+
+    ax.set_title("Top 10 Products by Quantity Sold")
+    ax.set_xlabel("Quantity Sold")
+    ax.set_ylabel("Product Description")
+    # Product names can be long
+    ax.tick_params(axis='y', labelsize=8)
+    return fig
+
+
+@_uses_plotting
+def top_customers_chart(top_customers, figsize=(10, 6), palette='crest'):
+    customer_df = top_customers.reset_index()
+    customer_df.columns = ['Customer', 'Revenue']
+    # Ids are labels, not numbers: keep the revenue order on the axis
+    customer_df['Customer'] = customer_df['Customer'].astype(str)
+
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
+    colors = sns.color_palette(palette, n_colors=len(customer_df))
+    sns.barplot(data=customer_df, x='Revenue', y='Customer', palette=colors, hue='Customer', legend=False, ax=ax)
+    # Add labels to end of bars
+    for p in ax.patches:
+        width = p.get_width()
+        ax.annotate(f'{width:,.0f}',
+                    (width, p.get_y() + p.get_height() / 2),
+                    ha='left', va='center', fontsize=8, color='black')
+
+    ax.set_title("Top 10 Customers by Revenue")
+    ax.set_xlabel("Revenue")
+    ax.set_ylabel("Customer ID")
+    return fig
+
+@_uses_plotting
+def correlation_chart(corr_df, figsize=(8, 6), palette='crest'):
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
+    sns.heatmap(corr_df, annot=True, fmt=".2f", cmap=sns.color_palette(palette, as_cmap=True), ax=ax)
+    ax.set_title("Correlation Matrix")
+    return fig
+
+
+@_uses_plotting
+def revenue_kde_chart(revenue, figsize=(8, 5), color='green'):
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
+    sns.kdeplot(revenue, fill=True, color=color, linewidth=1.5, ax=ax)
+    ax.set_title("KDE Plot of Revenue (Filtered - Below 99th Percentile)")
+    ax.set_xlabel("Revenue")
+    return fig
+
+
+@_uses_plotting
+def revenue_kde_binned_chart(kde, figsize=(8, 5), color='green'):
+    # Large-data variant: draws a density already computed by
+    # plot_data.binned_kde, styled like seaborn's filled kdeplot
+    grid, density = kde
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
+    ax.fill_between(grid, density, color=color, alpha=0.25, linewidth=0)
+    ax.plot(grid, density, color=color, linewidth=1.5)
+    ax.set_ylim(bottom=0)
+    ax.set_title("KDE Plot of Revenue (Filtered - Below 99th Percentile)")
+    ax.set_xlabel("Revenue")
+    ax.set_ylabel("Density")
+    return fig
+
+
+@_uses_plotting
+def scatter_quantity_revenue_chart(points, figsize=(10, 6), palette='Set2'):
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
+    sns.scatterplot(data=points, x="Quantity", y="Revenue", hue="Country", alpha=0.6, palette=palette, ax=ax)
+
+    ax.set_title("Quantity vs Revenue – Top 5 Countries by Revenue")
+    ax.set_xlabel("Quantity")
+    ax.set_ylabel("Revenue")
+    ax.set_xlim(0, 5000)
+    ax.set_ylim(0, 10000)
+    ax.legend(title="Country", bbox_to_anchor=(1.05, 1), loc='upper left')
+    return fig
+
+
+def _render_job(chart, data, path, style, output):
+    # output: (image format, dpi). The encoded image is written to path, or
+    # returned as bytes when path is None
+    _load_plotting()
+    image = _encode(chart(data, **style), *output)
+    return image if path is None else _write(image, path)
+
+
+def _render_job_timed(chart, data, path, style, output):
+    # Used in --profile mode: the worker times itself and the parent records
+    # the span, since the profiler only lives in the parent process
+    start_ns = time.time_ns()
+    result = _render_job(chart, data, path, style, output)
+    return result, start_ns, time.time_ns(), os.getpid(), profiler.max_rss_mb()
+
+
+class ChartRenderer:
+    # Renders independent charts concurrently on a process pool. The pool is
+    # created on first use and reused for every level and menu iteration.
+    # With a PlotCache, charts whose inputs are unchanged are not re-rendered.
+    # With write_files=False images are returned as encoded bytes and nothing
+    # is written to the jobs' output paths.
+    def __init__(self, max_workers=None, cache=None, image_format="png", dpi=None, write_files=True):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"unsupported image format '{image_format}'")
+        self.max_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+        self.cache = cache
+        self.output = (image_format, dpi)
+        self.write_files = write_files
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Workers import the plotting libraries as they start, in parallel
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_load_plotting)
+        return self._pool
+
+    def _target(self, path):
+        # The job's output path, with the extension of the configured format
+        if not self.write_files:
+            return None
+        path = f"{os.path.splitext(path)[0]}.{self.output[0]}"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return path
+
+    def render(self, jobs):
+        # jobs: {plot key: (chart function, data, output path, style kwargs)}
+        # Returns {plot key: written path, or image bytes}
+        targets = {key: self._target(path) for key, (_, _, path, _) in jobs.items()}
+        if self.cache is None:
+            return self._render_all({key: (chart, data, targets[key], style, self.output)
+                                     for key, (chart, data, _, style) in jobs.items()})
+
+        results = {}
+        pending = {}
+        entries = {}
+        ext = "." + self.output[0]
+        for key, (chart, data, _, style) in jobs.items():
+            cache_key = self.cache.key(chart, data, dict(style, _output=self.output), CHART_VERSION)
+            entry = self.cache.lookup(cache_key, ext)
+            if entry is not None:
+                # Cache hit: matplotlib is never touched
+                results[key] = self._from_cache(entry, targets[key])
+            else:
+                entries[key] = self.cache.entry_path(cache_key, ext)
+                target = entries[key] if self.write_files else None
+                pending[key] = (chart, data, target, style, self.output)
+
+        for key, rendered in self._render_all(pending).items():
+            if self.write_files:
+                results[key] = self.cache.publish(rendered, targets[key])
+            else:
+                _write(rendered, entries[key])
+                results[key] = rendered
+        if pending:
+            self.cache.evict()
+        return {key: results[key] for key in jobs}
+
+    def _from_cache(self, entry, target):
+        if target is not None:
+            return self.cache.publish(entry, target)
+        with open(entry, "rb") as f:
+            return f.read()
+
+    def _render_all(self, jobs):
+        if self.max_workers <= 1 or len(jobs) <= 1:
+            results = {}
+            for key, job in jobs.items():
+                with profiler.stage(f"chart:{key}"):
+                    results[key] = _render_job(*job)
+            return results
+        pool = self._get_pool()
+        active = profiler.active()
+        if active is None:
+            futures = {key: pool.submit(_render_job, *job) for key, job in jobs.items()}
+            return {key: future.result() for key, future in futures.items()}
+
+        futures = {key: pool.submit(_render_job_timed, *job) for key, job in jobs.items()}
+        results = {}
+        for key, future in futures.items():
+            results[key], start_ns, end_ns, pid, rss = future.result()
+            active.add_event(f"chart:{key}", start_ns, end_ns, {"max_rss_mb": round(rss, 1)},
+                             pid=pid, tid=pid)
+        return results
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,163 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Pre-aggregated Month x Country x Product cube. Every chart and KPI that is
+# a roll-up of those dimensions is answered from a few thousand cells instead
+# of the transaction rows.
+
+CUBE_FORMAT_VERSION = 2
+
+DIMENSIONS = ('Month', 'Country', 'Description')
+MEASURES = ('Revenue', 'Quantity', 'Lines')
+
+
+def _codes(values):
+    # Integer codes and the distinct values they index; free for categoricals
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    return pd.factorize(values)
+
+
+class AggregateCube:
+    # Cells are parallel arrays: integer codes for the three dimensions plus
+    # one array per measure, for the non-empty cells only. Month codes index
+    # self.months (months since 1970); product code -1 holds lines without
+    # a description, which roll-ups by product leave out as groupby does.
+    # Distinct invoices and customers are not sums over cells, so they are
+    # not measures; they are counted from the rows or the sketches.
+    def __init__(self, months, countries, products, cells):
+        self.months = months
+        self.countries = pd.Index(countries)
+        self.products = pd.Index(products)
+        self.cells = cells
+
+    @classmethod
+    def from_frame(cls, df, months=None, dense_cells=20_000_000):
+        # months: month of every row as months since 1970, recomputed when
+        # not given
+        if months is None:
+            months = df['InvoiceDate'].to_numpy().astype('datetime64[M]').view(np.int64)
+        first = int(months.min()) if len(months) else 0
+        month = months - first
+        n_months = int(month.max()) + 1 if len(month) else 0
+        country, countries = _codes(df['Country'])
+        product, products = _codes(df['Description'])
+        n_countries, n_products = len(countries), len(products) + 1
+
+        # Flat cell id, with product shifted so that -1 (no description) is 0
+        cell = (month * n_countries + country) * n_products + (product + 1)
+        n_cells = n_months * n_countries * n_products
+        if n_cells <= dense_cells:
+            # Small dimension space: one bincount per measure over every cell
+            lines = np.bincount(cell, minlength=n_cells)
+            cell_ids = np.flatnonzero(lines)
+            lookup = np.empty(n_cells, dtype=np.int64)
+            lookup[cell_ids] = np.arange(len(cell_ids))
+            index = lookup[cell]
+            lines = lines[cell_ids]
+        else:
+            index, cell_ids = pd.factorize(cell)
+            lines = np.bincount(index, minlength=len(cell_ids))
+        n = len(cell_ids)
+        revenue = np.bincount(index, weights=df['Revenue'].to_numpy(), minlength=n)
+        quantity = np.bincount(index, weights=df['Quantity'].to_numpy(), minlength=n)
+
+        month_country = cell_ids // n_products
+        cells = {
+            "month": (month_country // n_countries).astype(np.int32),
+            "country": (month_country % n_countries).astype(np.int32),
+            "product": (cell_ids % n_products - 1).astype(np.int32),
+            "Revenue": revenue,
+            "Quantity": np.rint(quantity).astype(np.int64),
+            "Lines": lines.astype(np.int64)
+        }
+        return cls(np.arange(first, first + n_months), countries, products, cells)
+
+    def __len__(self):
+        return len(self.cells["Revenue"])
+
+    def _labels(self, dimension, codes):
+        if dimension == 'Month':
+            return self.months[codes].astype('datetime64[M]').astype(str)
+        if dimension == 'Country':
+            return self.countries[codes].astype(str)
+        return self.products[codes].astype(str)
+
+    def rollup(self, by, measure):
+        # Sum of measure over every dimension not in by, as a Series indexed
+        # by the labels of the kept dimensions (months as 'YYYY-MM')
+        by = [by] if isinstance(by, str) else list(by)
+        cells = self.cells
+        columns = {"Month": cells["month"], "Country": cells["country"]}
+        if 'Description' in by:
+            columns["Description"] = cells["product"]
+        frame = pd.DataFrame({dimension: columns[dimension] for dimension in by})
+        if 'Description' in by:
+            keep = frame['Description'].to_numpy() >= 0
+            frame = frame[keep]
+            values = cells[measure][keep]
+        else:
+            values = cells[measure]
+        totals = pd.Series(values, index=frame.index).groupby([frame[d] for d in by]).sum()
+        if len(by) == 1:
+            totals.index = pd.Index(self._labels(by[0], totals.index.to_numpy()), name=by[0])
+        else:
+            totals.index = pd.MultiIndex.from_arrays(
+                [self._labels(d, totals.index.get_level_values(d).to_numpy()) for d in by], names=by)
+        return totals.rename(measure)
+
+    def total(self, measure):
+        return self.cells[measure].sum()
+
+    def save(self, path, key=""):
+        # A directory holding the cells as an uncompressed Arrow file with
+        # dictionary-encoded labels, plus a JSON header. key identifies the
+        # data the cube was built from.
+        os.makedirs(path, exist_ok=True)
+        products = pa.DictionaryArray.from_arrays(
+            pa.array(self.cells["product"], mask=self.cells["product"] < 0),
+            pa.array(self.products.astype(str)))
+        table = pa.table({
+            "Month": self.months[self.cells["month"]].astype(np.int32),
+            "Country": pa.DictionaryArray.from_arrays(self.cells["country"], pa.array(self.countries.astype(str))),
+            "Description": products,
+            **{measure: self.cells[measure] for measure in MEASURES}
+        })
+        tmp_path = os.path.join(path, "cells.arrow.tmp")
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, os.path.join(path, "cells.arrow"))
+        with open(os.path.join(path, "cube.json"), "w", encoding="utf-8") as f:
+            json.dump({"version": CUBE_FORMAT_VERSION, "key": key,
+                       "first_month": int(self.months[0]) if len(self.months) else 0,
+                       "n_months": len(self.months)}, f)
+
+    @classmethod
+    def load(cls, path, key=""):
+        # The saved cube, or None when it is missing, stale or of an older format
+        try:
+            with open(os.path.join(path, "cube.json"), encoding="utf-8") as f:
+                header = json.load(f)
+            if header.get("version") != CUBE_FORMAT_VERSION or header.get("key") != key:
+                return None
+            cells = feather.read_table(os.path.join(path, "cells.arrow"), memory_map=True)
+        except (FileNotFoundError, json.JSONDecodeError, pa.ArrowInvalid):
+            return None
+
+        first, n_months = header["first_month"], header["n_months"]
+        countries = cells.column("Country").combine_chunks()
+        products = cells.column("Description").combine_chunks()
+
+        return cls(
+            np.arange(first, first + n_months),
+            countries.dictionary.to_pylist(),
+            products.dictionary.to_pylist(),
+            {
+                "month": cells.column("Month").to_numpy() - first,
+                "country": countries.indices.to_numpy(zero_copy_only=False).astype(np.int32),
+                "product": products.indices.fill_null(-1).to_numpy().astype(np.int32),
+                **{measure: cells.column(measure).to_numpy() for measure in MEASURES}
+            })
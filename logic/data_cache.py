@@ -0,0 +1,99 @@
+import os
+import json
+import hashlib
+import pyarrow as pa
+import pyarrow.feather as feather
+
+CACHE_FORMAT_VERSION = 3
+
+
+class DatasetCache:
+    def __init__(self, sources, cache_dir=".cache", name="cleaned_dataset"):
+        self.sources = [os.path.abspath(s) for s in sources]
+        self.cache_dir = cache_dir
+        self.data_path = os.path.join(cache_dir, f"{name}.arrow")
+        self.meta_path = os.path.join(cache_dir, f"{name}.json")
+
+    @staticmethod
+    def _file_hash(path, block_size=1 << 20):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _fingerprint(self, previous=None):
+        # Size and mtime are a cheap pre-check; the content hash is only
+        # recomputed when they differ from what the cache recorded, so a
+        # plain `touch` of the workbook does not force a rebuild.
+        previous = {entry["path"]: entry for entry in (previous or [])}
+        fingerprint = []
+        for path in self.sources:
+            stat = os.stat(path)
+            old = previous.get(path)
+            if old and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+                sha256 = old["sha256"]
+            else:
+                sha256 = self._file_hash(path)
+            fingerprint.append({
+                "path": path,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": sha256
+            })
+        return fingerprint
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def load(self):
+        # Returns (df, meta) when a fresh cache exists, otherwise None
+        meta = self._read_meta()
+        if meta is None or meta.get("version") != CACHE_FORMAT_VERSION:
+            return None
+        if not os.path.exists(self.data_path):
+            return None
+
+        fingerprint = self._fingerprint(meta["sources"])
+        if [e["sha256"] for e in fingerprint] != [e["sha256"] for e in meta["sources"]]:
+            return None
+        if [e["size"] for e in fingerprint] != [e["size"] for e in meta["sources"]]:
+            return None
+        if fingerprint != meta["sources"]:
+            # Content unchanged but mtime moved - refresh the recorded key
+            meta["sources"] = fingerprint
+            self._write_meta(meta)
+
+        # Memory-map the Arrow IPC file so start-up cost does not depend on
+        # re-parsing the workbook
+        table = feather.read_table(self.data_path, memory_map=True)
+        return table.to_pandas(), meta
+
+    def _write_meta(self, meta):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+    def save(self, df, initial_count, final_count):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        tmp_path = self.data_path + ".tmp"
+        # Uncompressed so the file can be memory-mapped without decoding
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, self.data_path)
+        self._write_meta({
+            "version": CACHE_FORMAT_VERSION,
+            "sources": self._fingerprint(),
+            "initial_count": int(initial_count),
+            "final_count": int(final_count)
+        })
+
+    def clear(self):
+        for path in (self.data_path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+# Low-cardinality text columns stored as categoricals (an invoice spans
+# many lines, so invoice numbers repeat too)
+CATEGORY_COLUMNS = ["Invoice", "Country", "StockCode", "Description"]
+
+
+class DataCleaner:
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+
+    @staticmethod
+    def valid_rows(df):
+        # One combined mask for every cleaning rule, so the frame is copied once:
+        # drop null customer ids, cancelled invoices ('C' prefix) and rows
+        # with zero or negative quantity/price
+        invoice = df['Invoice']
+        if isinstance(invoice.dtype, pd.CategoricalDtype):
+            # Test each distinct invoice once and broadcast through the codes
+            cancelled = np.asarray(invoice.cat.categories.astype(str).str.startswith('C'))
+            codes = invoice.cat.codes.to_numpy()
+            is_cancelled = pd.Series(cancelled[codes] & (codes >= 0), index=df.index)
+        else:
+            if invoice.dtype == object or not pd.api.types.is_string_dtype(invoice.dtype):
+                invoice = invoice.astype(str)
+            is_cancelled = invoice.str.startswith('C', na=False)
+        return (
+            df['Customer ID'].notna()
+            & ~is_cancelled
+            & (df['Quantity'] > 0)
+            & (df['Price'] > 0)
+        )
+
+    @staticmethod
+    def compact(df):
+        for col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype("category")
+        # Customer ids are whole numbers once the nulls are gone
+        df['Customer ID'] = df['Customer ID'].astype("int32")
+        df['Quantity'] = pd.to_numeric(df['Quantity'], downcast="integer")
+        # Price stays float64: float32 would shift the revenue totals in the report
+        df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
+        df['Revenue'] = df['Quantity'] * df['Price']
+        return df
+
+    def clean(self, df):
+        cleaned = self.compact(df.loc[self.valid_rows(df)].reset_index(drop=True))
+        if self.verbose:
+            # A deep scan of object columns takes seconds on millions of rows,
+            # so it is only paid when the report is printed. compact() works
+            # on a copy, so df still holds the raw columns here.
+            before = df.memory_usage(deep=True, index=False)
+            self.print_memory_report(before, cleaned.memory_usage(deep=True, index=False))
+        return cleaned
+
+    @staticmethod
+    def print_memory_report(before, after):
+        mb = 1024 ** 2
+        print("--------------------------------------------------")
+        print(f"{'Column':<14}{'Before (MB)':>12}{'After (MB)':>12}{'Saved':>10}")
+        for col in before.index.union(after.index, sort=False):
+            b = before.get(col, 0) / mb
+            a = after.get(col, 0) / mb
+            saved = f"{(1 - a / b):.0%}" if b else "new"
+            print(f"{col:<14}{b:>12.2f}{a:>12.2f}{saved:>10}")
+        b, a = before.sum() / mb, after.sum() / mb
+        print(f"{'Total':<14}{b:>12.2f}{a:>12.2f}{(1 - a / b if b else 0):>10.0%}")
+        print("--------------------------------------------------")
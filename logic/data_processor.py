@@ -1,29 +1,463 @@
-import os
+import threading
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-sns.set_theme(style="darkgrid")
-#plt.style.use('dark_background')
+from logic import charts
+from logic.charts import ChartRenderer
+from logic.sketches import build_sketches
+from logic.plot_data import binned_kde, stratified_sample
+from logic.profiler import profiled, stage
+from logic.cube import AggregateCube, _codes
+
+class EmptyQuery(ValueError):
+    # Raised by DataProcessor.query when no row matches
+    pass
+
+
+def _distinct_per_group(group, codes, n_groups, max_cells=50_000_000):
+    # Number of distinct codes within each group in O(n): a presence table
+    # when groups x codes is small, otherwise hashed (group, code) pairs
+    n_codes = int(codes.max()) + 1 if len(codes) else 0
+    if n_groups * n_codes <= max_cells:
+        seen = np.zeros((n_groups, n_codes), dtype=bool)
+        seen[group, codes] = True
+        return seen.sum(axis=1)
+    pairs = pd.unique(group.astype(np.int64) * n_codes + codes)
+    return np.bincount(pairs // n_codes, minlength=n_groups)
+
+
+def _quintiles(values, ascending=True):
+    # 1-5 score by rank. Ties are broken by position so heavily tied columns
+    # (most customers have one invoice) still fill every quintile.
+    rank = values.rank(method='first', ascending=ascending, pct=True)
+    return np.ceil(rank * 5).astype(np.int8)
+
+
+# RFM segments on the recency (rows) x frequency (columns) score grid
+RFM_SEGMENTS = ["Champions", "Loyal Customers", "Potential Loyalists", "New Customers", "Promising",
+                "Need Attention", "About to Sleep", "At Risk", "Can't Lose", "Hibernating"]
+RFM_GRID = np.array([
+    # F=1 2  3  4  5
+    [9, 9, 7, 7, 8],  # R=1
+    [9, 9, 7, 7, 8],  # R=2
+    [6, 6, 5, 1, 1],  # R=3
+    [4, 2, 2, 1, 1],  # R=4
+    [3, 2, 2, 0, 0],  # R=5
+], dtype=np.int8)
+
+class _KeyIndex:
+    # Rows holding each distinct value of one column, as positions in date
+    # order: positions[indptr[k]:indptr[k + 1]] are the rows of value k,
+    # ascending. codes maps every date-ordered row back to its value.
+    def __init__(self, codes, keys):
+        self.codes = codes
+        self.keys = pd.Index(keys)
+        # Missing values (code -1) sort first and belong to no value
+        self.positions = np.argsort(codes, kind='stable')
+        self.indptr = np.cumsum(np.bincount(codes + 1, minlength=len(keys) + 1))
+
+    def lookup(self, values):
+        codes = self.keys.get_indexer(pd.Index(list(values)))
+        return np.unique(codes[codes >= 0])
+
+    def _bounds(self, code, lo, hi):
+        rows = self.positions[self.indptr[code]:self.indptr[code + 1]]
+        return rows, np.searchsorted(rows, lo), np.searchsorted(rows, hi)
+
+    def count(self, codes, lo, hi):
+        total = 0
+        for code in codes:
+            _, start, stop = self._bounds(code, lo, hi)
+            total += stop - start
+        return total
+
+    def rows(self, codes, lo, hi):
+        # Rows in [lo, hi) holding one of the values, in date order
+        blocks = []
+        for code in codes:
+            rows, start, stop = self._bounds(code, lo, hi)
+            blocks.append(rows[start:stop])
+        if len(blocks) == 1:
+            return blocks[0]
+        return np.sort(np.concatenate(blocks)) if blocks else np.array([], dtype=np.intp)
+
+    def contains(self, codes, rows):
+        allowed = np.zeros(len(self.keys) + 1, dtype=bool)
+        allowed[codes + 1] = True
+        return allowed[self.codes[rows] + 1]
+
 
 class DataProcessor:
-    def __init__(self,df):
+    # Aggregates shared by every report level, computed at most once per
+    # dataset version. Maps aggregate name -> method that computes it.
+    AGGREGATES = {
+        "cube": "_compute_cube",
+        "kpi_values": "_compute_kpi_values",
+        "country_revenue": "_compute_country_revenue",
+        "monthly_revenue": "_compute_monthly_revenue",
+        "product_quantity": "_compute_product_quantity",
+        "product_counts": "_compute_product_counts",
+        "country_counts": "_compute_country_counts",
+        "correlation": "_compute_correlation",
+        "revenue_p99": "_compute_revenue_p99",
+        "product_summary": "_compute_product_summary",
+        "row_months": "_compute_row_months",
+        "invoice_codes": "_compute_invoice_codes",
+        "invoice_totals": "_compute_invoice_totals",
+        "monthly_kpis": "_compute_monthly_kpis",
+        "revenue_outliers": "_compute_revenue_outliers",
+        "customer_rfm": "_compute_customer_rfm",
+        "customer_segments": "_compute_customer_segments",
+        "top_customers": "_compute_top_customers",
+        "top_customers_by_country": "_compute_top_customers_by_country",
+        "sketches": "_compute_sketches",
+        "date_order": "_compute_date_order",
+        "country_index": "_compute_country_index",
+        "product_index": "_compute_product_index",
+        "customer_index": "_compute_customer_index"
+    }
+
+    # Charts of levels 2 and 3, in report order. Maps plot key -> method
+    # returning its render job (chart function, data, output path, style),
+    # or None when the chart cannot be drawn from this data.
+    LEVEL_2_CHARTS = {
+        "country_revenue_plot": "_country_revenue_job",
+        "monthly_revenue_plot": "_monthly_revenue_job",
+        "product_quantity_plot": "_product_quantity_job",
+        "top_customers_plot": "_top_customers_job"
+    }
+    LEVEL_3_CHARTS = {
+        "correlation_matrix_plot": "_correlation_job",
+        "revenue_kde_plot": "_revenue_kde_job",
+        "scatter_quantity_revenue_plot": "_scatter_job"
+    }
+
+    def __init__(self,df, renderer=None, approximate=False, large_data_threshold=200_000,
+                 scatter_points=50_000, appendices=False):
         self.df = df
+        # Level 3 ends with full-length appendix tables when enabled
+        self.appendices = appendices
+        # Above this many rows the KDE is computed on a binned histogram and the
+        # scatter plot is stratified-downsampled, so chart time stays flat
+        self.large_data_threshold = large_data_threshold
+        self.scatter_points = scatter_points
+        # Approximate mode answers distinct counts and percentiles from
+        # mergeable sketches instead of hashing/sorting whole columns
+        self.approximate = approximate
+        # Charts are rendered concurrently on a shared process pool
+        self.renderer = renderer or ChartRenderer()
+        self.version = 0
+        # Set when aggregates were seeded instead of computed from self.df
+        self.seeded = False
+        self._aggregates = {}
+        self._levels = {}
+        # Aggregates may be requested from two threads (see logic.service)
+        self._lock = threading.RLock()
+        self._prepare()
+
+    def _prepare(self):
+        # Derived columns are added once here instead of in every handler.
+        # DataCleaner already provides them, so this is a no-op for cleaned data.
+        if 'Revenue' not in self.df.columns:
+            self.df['Revenue'] = self.df['Quantity'] * self.df['Price']
+        if not pd.api.types.is_datetime64_any_dtype(self.df['InvoiceDate']):
+            self.df['InvoiceDate'] = pd.to_datetime(self.df['InvoiceDate'])
+
+    def set_data(self, df):
+        self.df = df
+        self._prepare()
+        self.invalidate()
+
+    def invalidate(self):
+        # Must be called whenever self.df is changed in place
+        self.version += 1
+        self._aggregates.clear()
+        self._levels.clear()
+
+    def aggregate(self, name):
+        with self._lock:
+            if name not in self._aggregates:
+                with stage(f"aggregate:{name}"):
+                    self._aggregates[name] = getattr(self, self.AGGREGATES[name])()
+            return self._aggregates[name]
+
+    def seed_aggregates(self, aggregates):
+        # Pre-computed aggregates (e.g. from the streaming mode) take the
+        # place of the ones that would otherwise be computed from self.df
+        self.seeded = True
+        self._aggregates.update(aggregates)
+
+    def set_cube(self, cube):
+        # A cube loaded from disk for exactly these rows; unlike seeded
+        # aggregates it is a cache, and everything else is still computed
+        self._aggregates["cube"] = cube
+
+    def _level(self, key, build):
+        # Level results are memoized too, so level 3 reuses levels 1 and 2
+        if key not in self._levels:
+            self._levels[key] = build()
+        return self._levels[key]
+
+    def _compute_cube(self):
+        # Month x Country x Product sums, built in one pass over the rows.
+        # Roll-ups by any of those dimensions are answered from its cells.
+        return AggregateCube.from_frame(self.df, months=self.aggregate("row_months"))
+
+    def _compute_kpi_values(self):
+        cube = self.aggregate("cube")
+        if self.approximate:
+            sketches = self.aggregate("sketches")
+            total_transactions = sketches["invoices"].count()
+            unique_customers = sketches["customers"].count()
+        else:
+            # Invoices and customers span cells, so they are not in the cube
+            total_transactions = self.df['Invoice'].nunique()
+            unique_customers = self.df['Customer ID'].nunique()
+        total_revenue = cube.total('Revenue')
+        return {
+            "total_transactions": total_transactions,
+            "total_revenue": total_revenue,
+            "avg_revenue": total_revenue / total_transactions if total_transactions else 0,
+            "unique_customers": unique_customers
+        }
+
+    def _compute_country_revenue(self):
+        return self.aggregate("cube").rollup('Country', 'Revenue').sort_values(ascending=False)
+
+    def _compute_monthly_revenue(self):
+        return self.aggregate("cube").rollup('Month', 'Revenue')
+
+    def _compute_product_quantity(self):
+        return self.aggregate("cube").rollup('Description', 'Quantity').sort_values(ascending=False)
+
+    def _compute_product_counts(self):
+        return self.aggregate("cube").rollup('Description', 'Lines').sort_values(ascending=False)
+
+    def _compute_country_counts(self):
+        return self.aggregate("cube").rollup('Country', 'Lines').sort_values(ascending=False)
+
+    def _compute_correlation(self):
+        return self.df[['Quantity', 'Price', 'Revenue']].corr()
+
+    def _compute_revenue_p99(self):
+        if self.approximate:
+            return self.aggregate("sketches")["revenue"].quantile(0.99)
+        return self.df['Revenue'].quantile(0.99)
+
+    def _compute_product_summary(self):
+        cube = self.aggregate("cube")
+        summary = pd.concat([cube.rollup('Description', measure) for measure in ('Quantity', 'Revenue', 'Lines')],
+                            axis=1)
+        return summary.sort_values('Revenue', ascending=False).reset_index()
+
+    def _compute_row_months(self):
+        # Month of every row as months since 1970, shared by the monthly
+        # tables. Rows are floored to days, and each day in the (short) date
+        # range is mapped to its month through a lookup table, which is much
+        # cheaper than a calendar conversion per row.
+        days = self.df['InvoiceDate'].to_numpy().astype('datetime64[D]').view(np.int64)
+        if not len(days):
+            return days
+        first = days.min()
+        calendar = np.arange(first, days.max() + 1).astype('datetime64[D]')
+        return calendar.astype('datetime64[M]').view(np.int64)[days - first]
+
+    def _compute_invoice_codes(self):
+        return _codes(self.df['Invoice'])
+
+    def _compute_invoice_totals(self):
+        # One row per invoice: its revenue, plus the country, date and
+        # customer of its lines. Built with bincount over the invoice codes
+        # instead of a groupby over every line.
+        codes, invoices = self.aggregate("invoice_codes")
+        present = np.bincount(codes, minlength=len(invoices)) > 0
+        revenue = np.bincount(codes, weights=self.df['Revenue'].to_numpy(), minlength=len(invoices))
+        # Position of one line of each invoice (the last write wins)
+        row = np.empty(len(invoices), dtype=np.intp)
+        row[codes] = np.arange(len(codes))
+        row = row[present]
+        dates = self.df['InvoiceDate'].to_numpy()[row]
+        return pd.DataFrame({
+            "Invoice": invoices[present],
+            # take() keeps categoricals as codes instead of materialising strings
+            "Country": self.df['Country'].array.take(row),
+            "InvoiceDate": dates,
+            "Month": dates.astype('datetime64[M]'),
+            "Customer ID": self.df['Customer ID'].to_numpy()[row],
+            "Revenue": revenue[present]
+        })
+
+    def _compute_monthly_kpis(self):
+        # Revenue, distinct invoices and customers per month in one O(n) pass
+        months = self.aggregate("row_months")
+        if not len(months):
+            return pd.DataFrame(columns=["Month", "Revenue", "Invoices", "Customers", "AOV", "MoM Change"])
+        first = months.min()
+        month = months - first
+        n_months = int(month.max()) + 1
+        lines = np.bincount(month, minlength=n_months)
+        revenue = np.bincount(month, weights=self.df['Revenue'].to_numpy(), minlength=n_months)
+        invoices = _distinct_per_group(month, self.aggregate("invoice_codes")[0], n_months)
+        customer = self.df['Customer ID'].to_numpy()
+        customers = _distinct_per_group(month, customer - customer.min(), n_months)
+
+        kpis = pd.DataFrame({
+            "Month": (np.arange(n_months) + first).astype('datetime64[M]').astype(str),
+            "Revenue": revenue,
+            "Invoices": invoices,
+            "Customers": customers
+        })[lines > 0].reset_index(drop=True)
+        kpis["AOV"] = kpis["Revenue"] / kpis["Invoices"]
+        kpis["MoM Change"] = kpis["Revenue"].pct_change()
+        return kpis
+
+    def _compute_revenue_outliers(self):
+        # Invoices whose revenue is above Q3 + 1.5 * IQR of the invoices of
+        # the same country and month, with their z-score in that group
+        invoices = self.aggregate("invoice_totals")
+        keys = ['Country', 'Month']
+        grouped = invoices.groupby(keys, observed=True)['Revenue']
+        bounds = grouped.quantile([0.25, 0.75]).unstack()
+        bounds.columns = ['Q1', 'Q3']
+        invoices = invoices.join(bounds, on=keys)
+        fence = invoices['Q3'] + 1.5 * (invoices['Q3'] - invoices['Q1'])
+        z_score = (invoices['Revenue'] - grouped.transform('mean')) / grouped.transform('std')
+
+        outliers = invoices.assign(**{"Z-Score": z_score})[invoices['Revenue'] > fence]
+        outliers = outliers.sort_values('Revenue', ascending=False).reset_index(drop=True)
+        outliers['Month'] = outliers['Month'].dt.strftime('%Y-%m')
+        return outliers[['Invoice', 'Country', 'Month', 'Customer ID', 'Revenue', 'Z-Score']]
+
+    def _compute_customer_rfm(self):
+        # Recency (days from the last purchase to the day after the latest
+        # sale), Frequency (invoices) and Monetary (revenue) of every
+        # customer in one groupby over invoices, with 1-5 scores and segment
+        invoices = self.aggregate("invoice_totals")
+        rfm = invoices.groupby('Customer ID').agg(
+            Last=('InvoiceDate', 'max'), Frequency=('Revenue', 'size'), Monetary=('Revenue', 'sum'))
+        snapshot = invoices['InvoiceDate'].max().normalize() + pd.Timedelta(days=1)
+        rfm.insert(0, 'Recency', (snapshot - rfm.pop('Last')).dt.days)
+        rfm['R'] = _quintiles(rfm['Recency'], ascending=False)
+        rfm['F'] = _quintiles(rfm['Frequency'])
+        rfm['M'] = _quintiles(rfm['Monetary'])
+        rfm['Segment'] = pd.Categorical.from_codes(RFM_GRID[rfm['R'] - 1, rfm['F'] - 1], RFM_SEGMENTS)
+        return rfm.reset_index()
+
+    def _compute_customer_segments(self):
+        rfm = self.aggregate("customer_rfm")
+        segments = rfm.groupby('Segment', observed=True).agg(
+            Customers=('Customer ID', 'size'), Revenue=('Monetary', 'sum'),
+            Recency=('Recency', 'mean'), Frequency=('Frequency', 'mean'))
+        segments.insert(1, 'Customer Share', segments['Customers'] / len(rfm))
+        segments.insert(3, 'Revenue Share', segments['Revenue'] / rfm['Monetary'].sum())
+        segments.index = segments.index.astype(str)
+        return segments.sort_values('Revenue', ascending=False).reset_index()
+
+    def _compute_top_customers(self, n=10):
+        # Partial selection: only the n largest are ordered
+        rfm = self.aggregate("customer_rfm")
+        return rfm.set_index('Customer ID')['Monetary'].nlargest(n).rename('Revenue')
+
+    def _compute_top_customers_by_country(self, n=3):
+        # A customer's revenue in each country they bought from. nlargest
+        # selects the n best pairs of each country without sorting the rest;
+        # they come out in revenue order, which gives the rank.
+        invoices = self.aggregate("invoice_totals")
+        pairs = invoices.groupby(['Country', 'Customer ID'], observed=True).agg(
+            Invoices=('Revenue', 'size'), Revenue=('Revenue', 'sum'))
+        best = pairs['Revenue'].groupby(level='Country', observed=True, group_keys=False).nlargest(n)
+        top = pairs.loc[best.index].reset_index()
+        top.insert(1, 'Rank', top.groupby('Country', observed=True).cumcount().to_numpy() + 1)
+        top['Country'] = top['Country'].astype(str)
+        # Countries in revenue order, as in the charts
+        order = self.aggregate("country_revenue").index.get_indexer(top['Country'])
+        return top.iloc[np.lexsort((top['Rank'].to_numpy(), order))].reset_index(drop=True)
+
+    def _compute_sketches(self):
+        return build_sketches(self.df)
+
+    def _compute_date_order(self):
+        # Row order by InvoiceDate (None when the frame is already in date
+        # order, as the workbook is) and the dates in that order
+        dates = self.df['InvoiceDate'].to_numpy()
+        if self.df['InvoiceDate'].is_monotonic_increasing:
+            return None, dates
+        order = np.argsort(dates, kind='stable')
+        return order, dates[order]
+
+    def _key_index(self, column):
+        order, _ = self.aggregate("date_order")
+        codes, keys = _codes(self.df[column])
+        return _KeyIndex(codes if order is None else codes[order], keys)
+
+    def _compute_country_index(self):
+        return self._key_index('Country')
+
+    def _compute_product_index(self):
+        return self._key_index('StockCode')
+
+    def _compute_customer_index(self):
+        return self._key_index('Customer ID')
+
+    def query(self, start=None, end=None, countries=None, stock_codes=None, customers=None):
+        # The rows with start <= InvoiceDate < end whose country, stock code
+        # and customer are in the given lists (None means no filter), as a
+        # new DataProcessor that every level handler runs on unchanged.
+        # Indexes are built once: the date range is a binary search in date
+        # order, and only the most selective list is expanded to rows, so a
+        # query costs time in proportion to the rows it selects.
+        if self.seeded:
+            raise ValueError("queries need row-level data, not pre-computed aggregates")
+        order, dates = self.aggregate("date_order")
+        lo = 0 if start is None else int(np.searchsorted(dates, pd.Timestamp(start).to_datetime64()))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, pd.Timestamp(end).to_datetime64()))
+        hi = max(lo, hi)
+
+        filters = []
+        for name, values in (("country_index", countries), ("product_index", stock_codes),
+                             ("customer_index", customers)):
+            if values is not None:
+                index = self.aggregate(name)
+                filters.append((index, index.lookup(values)))
+        if filters:
+            filters.sort(key=lambda f: f[0].count(f[1], lo, hi))
+            index, codes = filters[0]
+            rows = index.rows(codes, lo, hi)
+            for index, codes in filters[1:]:
+                rows = rows[index.contains(codes, rows)]
+        else:
+            rows = np.arange(lo, hi)
+        if order is not None:
+            rows = order[rows]
+        if not len(rows):
+            raise EmptyQuery("no rows match the query")
+
+        return DataProcessor(self.df.take(rows).reset_index(drop=True), renderer=self.renderer,
+                             approximate=self.approximate, large_data_threshold=self.large_data_threshold,
+                             scatter_points=self.scatter_points, appendices=self.appendices)
+
+    def approximation_note(self):
+        sketches = self.aggregate("sketches")
+        return (f"Approximate mode: transaction and customer counts are HyperLogLog estimates "
+                f"(±{sketches['invoices'].relative_error():.1%} standard error); the revenue 99th "
+                f"percentile is a KLL estimate (±{sketches['revenue'].rank_error():.1%} rank error, "
+                f"99% confidence).")
 
     def _generate_kpis(self):
-        total_transactions = self.df['Invoice'].nunique()
-        total_revenue = (self.df['Quantity'] * self.df['Price']).sum()
-        avg_revenue = total_revenue / total_transactions if total_transactions else 0
-        unique_customers = self.df['Customer ID'].nunique()
+        kpis = self.aggregate("kpi_values")
 
         return {
-            "total_transactions": f"{total_transactions:,}",
-            "total_revenue": f"£{total_revenue:,.2f}",
-            "avg_revenue": f"£{avg_revenue:,.2f}",
-            "unique_customers": f"{unique_customers:,}"
+            "total_transactions": f"{kpis['total_transactions']:,}",
+            "total_revenue": f"£{kpis['total_revenue']:,.2f}",
+            "avg_revenue": f"£{kpis['avg_revenue']:,.2f}",
+            "unique_customers": f"{kpis['unique_customers']:,}"
         }
 
+    @profiled("DataProcessor._handle_level_1")
     def _handle_level_1(self, final_count):
-        
+        return self._level(("level_1", final_count), lambda: self._build_level_1(final_count))
+
+    def _build_level_1(self, final_count):
+
         # Add Description about the dataset
         data_desc = "This Online Retail II data set contains all the transactions occurring for a UK-based and registered, non-store online retail between 01/12/2009 and 09/12/2011.The company mainly sells unique all-occasion gift-ware. Many customers of the company are wholesalers."
         
@@ -52,9 +486,10 @@ class DataProcessor:
         }
 
         # Add 2 interesting fact about data
-        num_countries = len(self.df['Country'].unique())
-        top_product = self.df['Description'].value_counts().idxmax()
-        top_country_customers = self.df['Country'].value_counts().idxmax()
+        country_counts = self.aggregate("country_counts")
+        num_countries = int((country_counts > 0).sum())
+        top_product = self.aggregate("product_counts").idxmax()
+        top_country_customers = country_counts.idxmax()
 
         data_analysis = {
             "interesting_fact1" : f"The dataset contains {final_count} cleaned transaction records spanning two years, after removing null CustomerIDs, cancellations, and zero-value rows.",
@@ -63,176 +498,111 @@ class DataProcessor:
             "interesting_fact4": f"The country with the highest number of customers is {top_country_customers}."            
         }
 
-        return {"description" : data_desc,
+        report_data = {"description" : data_desc,
                 "column_descriptions": data_columns,
                 "data_types": data_types,
                 "interesting_facts": data_analysis,
                 "kpis": self._generate_kpis()
                 }
+        if self.approximate:
+            report_data["approximation_note"] = self.approximation_note()
+        return report_data
     
+    @profiled("DataProcessor._handle_level_2")
     def _handle_level_2(self):
-        # Add new features
-        self.df['Revenue'] = self.df['Quantity'] * self.df['Price']
-        self.df['InvoiceDate'] = pd.to_datetime(self.df['InvoiceDate'])
-
-
-        # Plot 1 - Top 10 countries by sales revenue
-        # ------------------------------------------
-        country_revenue = self.df.groupby('Country')['Revenue'].sum().sort_values(ascending=False).head(10)
-        # Convert Series to DataFrame
-        country_df = country_revenue.reset_index().copy()
-        country_df.columns = ['Country', 'Revenue']       
-
-        # Bar plot
-        plt.figure(figsize=(10, 6))
-        palette = sns.color_palette('crest', n_colors=10)
-        ax = sns.barplot(data=country_df, x='Country', y='Revenue', palette=palette, hue='Country', legend=False)
-        # Add labels on top of bars
-        for p in ax.patches:
-            height = p.get_height()
-            ax.annotate(f'{height:,.0f}',
-                        (p.get_x() + p.get_width() / 2., height),
-                        ha='center', va='bottom', fontsize=8, color='black')
-
-        plt.title("Top 10 Countries by Revenue")
-        plt.xlabel("Country")
-        plt.ylabel("Revenue")
-        plt.xticks(rotation=45)
-        plt.grid(axis='y')
-        plt.tight_layout()  # Proper function call
-        plt.savefig("assets/top_countries_revenue.png")
-        plt.close()
-    
-        # Plot 2 - Sales trend over time
-        # ------------------------------------------
-        self.df['Month'] = self.df['InvoiceDate'].dt.to_period('M')
-        monthly_revenue = self.df.groupby("Month")['Revenue'].sum()
-        monthly_revenue.index = monthly_revenue.index.astype(str)
-
-        # Set style before plotting
-        # Get a color from a seaborn palette
-        palette = sns.color_palette('crest')  # or 'Blues', 'Purples', etc.
-        #line_color = palette[10]  # Pick the first color from the palette
-        plt.figure(figsize=(12, 6))
-        plt.plot(monthly_revenue.index, monthly_revenue.values, marker='o', linestyle='-', color='green', label="Revenue")
-        # Add data labels
-        for x, y in zip(monthly_revenue.index, monthly_revenue.values):
-            plt.text(x, y + 1000, f'{y:,.0f}', ha='center', va='bottom', fontsize=8, color='black')
-        plt.xticks(rotation=45)
-        plt.title('Monthly Revenue Over Time')
-        plt.xlabel('Year-Month')
-        plt.ylabel('Revenue')
-        plt.grid(True)
-        # Save file to assets folder
-        plt.tight_layout()
-        plt.savefig("assets/monthly_revenue_trend.png")
-        plt.close()
- 
-
-        # Plot 3 - Top 10 products by quantity sold
-        # ------------------------------------------
-        product_quantity = self.df.groupby('Description')['Quantity'].sum().sort_values(ascending=False).head(10)
-        product_df = product_quantity.reset_index().copy()
-        product_df.columns = ['Product', 'Quantity']
-        product_df['Product'] = product_df['Product'].str.slice(0, 40) + '...'
-
-        # Bar plot (horizontal for better label fit)
-        plt.figure(figsize=(10, 6))
-        palette = sns.color_palette('crest', n_colors=10)
-        ax = sns.barplot(data=product_df, x='Quantity', y='Product', palette=palette, hue='Product', legend=False)
-        # Add labels to end of bars
-        for p in ax.patches:
-            width = p.get_width()
-            ax.annotate(f'{width:,.0f}',
-                        (width + 10, p.get_y() + p.get_height() / 2),
-                        ha='left', va='center', fontsize=8, color='black')
-
-        # Title and labels
-        plt.title("Top 10 Products by Quantity Sold")
-        plt.xlabel("Quantity Sold")
-        plt.ylabel("Product Description")
-
-        # Optional: Adjust font size if product names are very long
-        plt.yticks(fontsize=8)
-
-        plt.tight_layout()
-        plt.savefig("assets/top_products_quantity.png")
-        plt.close()
-
-
-        plots = {
-            "country_revenue_plot": "assets/top_countries_revenue.png",
-            "monthly_revenue_plot": "assets/monthly_revenue_trend.png",
-            "product_quantity_plot": "assets/top_products_quantity.png"}
-        
-        return plots
-    
+        return self._level("level_2", self._build_level_2)
+
+    def _build_level_2(self):
+        return self.renderer.render(self._chart_jobs(self.LEVEL_2_CHARTS))
+
+    def _chart_jobs(self, registry):
+        # Render jobs of the available charts in registry. Workers only
+        # receive the aggregated data they plot.
+        jobs = {key: getattr(self, method)() for key, method in registry.items()}
+        return {key: job for key, job in jobs.items() if job is not None}
+
+    def chart(self, key):
+        # One chart image or path, or None when it is not available for this
+        # data. Only that chart is rendered unless its level was built already.
+        for level, registry in (("level_2", self.LEVEL_2_CHARTS), ("level_3", self.LEVEL_3_CHARTS)):
+            if key in registry:
+                if level in self._levels:
+                    return self._levels[level].get(key)
+                job = getattr(self, registry[key])()
+                return None if job is None else self.renderer.render({key: job})[key]
+        raise KeyError(key)
+
+    # Plot 1 - Top 10 countries by sales revenue
+    def _country_revenue_job(self):
+        return (charts.country_revenue_chart, self.aggregate("country_revenue").head(10),
+                "assets/top_countries_revenue.png", {})
+
+    # Plot 2 - Sales trend over time
+    def _monthly_revenue_job(self):
+        return (charts.monthly_revenue_chart, self.aggregate("monthly_revenue"),
+                "assets/monthly_revenue_trend.png", {})
+
+    # Plot 3 - Top 10 products by quantity sold
+    def _product_quantity_job(self):
+        return (charts.product_quantity_chart, self.aggregate("product_quantity").head(10),
+                "assets/top_products_quantity.png", {})
+
+    # Plot 4 - Top 10 customers by revenue (needs row-level customer data)
+    def _top_customers_job(self):
+        top_customers = self.aggregate("top_customers")
+        if top_customers is None:
+            return None
+        return (charts.top_customers_chart, top_customers, "assets/top_customers_revenue.png", {})
+
+    @profiled("DataProcessor._handle_level_3")
     def _handle_level_3(self):
-        if 'Revenue' not in self.df.columns:
-            self.df['Revenue'] = self.df['Quantity'] * self.df['Price']        
-
-        os.makedirs("assets", exist_ok=True)
-        plots = {}
-
-        # 1. Correlation Heatmap
-        corr_df = self.df[['Quantity', 'Price', 'Revenue']].corr()
-        plt.figure(figsize=(8, 6))
-        sns.heatmap(corr_df, annot=True, fmt=".2f", cmap=sns.color_palette("crest", as_cmap=True))
-        plt.title("Correlation Matrix")
-        plt.tight_layout()
-        path1 = "assets/correlation_heatmap.png"
-        plt.savefig(path1)
-        plt.close()
-        plots["correlation_matrix_plot"] = path1
-
-        # 2. KDE plot of Revenue (filtered to remove outliers)
-        revenue_filtered = self.df[self.df['Revenue'] < self.df['Revenue'].quantile(0.99)]
-
-        plt.figure(figsize=(8, 5))
-        sns.kdeplot(revenue_filtered['Revenue'], fill=True, color='green', linewidth=1.5)
-        plt.title("KDE Plot of Revenue (Filtered - Below 99th Percentile)")
-        plt.xlabel("Revenue")
-        plt.tight_layout()
-        path2 = "assets/kde_revenue.png"
-        plt.savefig(path2)
-        plt.close()
-        plots["revenue_kde_plot"] = path2
-
-
-        # 3. Scatter Plot (Quantity vs Revenue) for Top 5 Revenue Countries
-        top_countries = self.df.groupby('Country')['Revenue'].sum().nlargest(5).index
-        filtered_df = self.df[self.df['Country'].isin(top_countries)]
-
-        plt.figure(figsize=(10, 6))
-        sns.scatterplot(
-            data=filtered_df,
-            x="Quantity",
-            y="Revenue",
-            hue="Country",
-            alpha=0.6,
-            palette="Set2"
-        )
-
-
-        plt.title("Quantity vs Revenue – Top 5 Countries by Revenue")
-        plt.xlabel("Quantity")
-        plt.ylabel("Revenue")
-
-        plt.xlim(0, 5000)
-        plt.ylim(0, 10000)
-
-        plt.legend(title="Country", bbox_to_anchor=(1.05, 1), loc='upper left')
-        plt.tight_layout()
-
-        path3 = "assets/scatter_quantity_revenue.png"
-        plt.savefig(path3)
-        plt.close()
-        plots["scatter_quantity_revenue_plot"] = path3
-
-
-
-        return plots
-
-
-
-
+        return self._level("level_3", self._build_level_3)
+
+    def _top_countries(self):
+        return self.aggregate("country_revenue").head(5).index
+
+    # 1. Correlation Heatmap
+    def _correlation_job(self):
+        return (charts.correlation_chart, self.aggregate("correlation"), "assets/correlation_heatmap.png", {})
+
+    # 2. KDE plot of Revenue (filtered to remove outliers)
+    def _revenue_kde_job(self):
+        revenue = self.df['Revenue']
+        revenue_filtered = revenue[revenue < self.aggregate("revenue_p99")].to_numpy()
+        if len(revenue_filtered) > self.large_data_threshold:
+            return (charts.revenue_kde_binned_chart, binned_kde(revenue_filtered), "assets/kde_revenue.png", {})
+        return (charts.revenue_kde_chart, revenue_filtered, "assets/kde_revenue.png", {})
+
+    # 3. Scatter Plot (Quantity vs Revenue) for Top 5 Revenue Countries
+    def _scatter_job(self):
+        top_countries = self._top_countries()
+        points = self.df.loc[self.df['Country'].isin(top_countries), ['Quantity', 'Revenue', 'Country']]
+        if len(points) > self.large_data_threshold:
+            # Only points inside the plotted window matter; then keep a
+            # per-country share so every country stays visible
+            points = points[(points['Quantity'] <= 5000) & (points['Revenue'] <= 10000)]
+            points = stratified_sample(points, 'Country', self.scatter_points)
+        # Categorical hue limited to the five countries, in revenue order
+        points['Country'] = pd.Categorical(points['Country'].astype(str), categories=list(top_countries))
+        return (charts.scatter_quantity_revenue_chart, points, "assets/scatter_quantity_revenue.png", {})
+
+    def _build_level_3(self):
+        top_countries = self._top_countries()
+        jobs = self._chart_jobs(self.LEVEL_3_CHARTS)
+        report_data = self.renderer.render(jobs)
+        # Tables for the level-3 report, as DataFrames. Aggregates built
+        # without row-level data (streaming/store modes) provide None.
+        for key in ("monthly_kpis", "revenue_outliers", "customer_segments"):
+            table = self.aggregate(key)
+            if table is not None:
+                report_data[key] = table
+        by_country = self.aggregate("top_customers_by_country")
+        if by_country is not None:
+            report_data["top_customers_by_country"] = by_country[by_country['Country'].isin(top_countries)]
+        if self.appendices:
+            report_data["appendices"] = {"Products by Revenue": self.aggregate("product_summary")}
+            customer_rfm = self.aggregate("customer_rfm")
+            if customer_rfm is not None:
+                report_data["appendices"]["Customers by Revenue (RFM)"] = customer_rfm.sort_values(
+                    'Monetary', ascending=False)
+        return report_data
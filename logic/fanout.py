@@ -0,0 +1,102 @@
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+from logic import profiler
+from logic.charts import ChartRenderer
+from logic.data_processor import DataProcessor, EmptyQuery
+from logic.report_generator import ReportGenerator
+
+# Per-country report fan-out. The cleaned dataset is published to the workers
+# as the memory-mapped Arrow file of the dataset cache: each worker maps it
+# once and copies out only the rows of the country it is building. No frame
+# is pickled, and the mapped pages are shared through the OS page cache.
+
+# The mapped table of this worker process
+_dataset = None
+
+
+def _open_dataset(path):
+    global _dataset
+    # A forked worker inherits the parent's profiler; spans are recorded by
+    # the parent instead
+    profiler.disable()
+    _dataset = feather.read_table(path, memory_map=True)
+
+
+def _country_rows(country):
+    mask = pc.is_in(_dataset['Country'], value_set=pa.array([country]))
+    # Single-threaded: every core already runs a worker
+    return _dataset.filter(mask).to_pandas(use_threads=False)
+
+
+def country_dirname(country):
+    # Country names as directory names
+    return re.sub(r"[^\w\- ]", "_", country).strip() or "_"
+
+
+def _build_country(country, out_dir, levels, chart_options, appendices, filters, approximate):
+    start_ns = time.time_ns()
+    df = _country_rows(country)
+    # Charts are rendered inline and kept in memory: the pool is already one
+    # process per core, and workers must not overwrite each other's assets/
+    dp = DataProcessor(df, renderer=ChartRenderer(max_workers=1, write_files=False, **chart_options),
+                       approximate=approximate, appendices=appendices)
+    if filters:
+        try:
+            dp = dp.query(**filters)
+        except EmptyQuery:
+            # Nothing to report for this country, which is not an error
+            return None, start_ns, time.time_ns(), os.getpid(), profiler.max_rss_mb()
+    report_data_l1 = dp._handle_level_1(len(dp.df))
+    report_data_l2 = dp._handle_level_2() if max(levels) >= 2 else None
+    report_data_l3 = dp._handle_level_3() if 3 in levels else None
+
+    country_dir = os.path.join(out_dir, country_dirname(country))
+    os.makedirs(country_dir, exist_ok=True)
+    outputs = {level: os.path.join(country_dir, f"Level{level}_Report.pdf") for level in levels}
+    ReportGenerator(country=country).generate_reports(outputs, report_data_l1, report_data_l2, report_data_l3)
+    return outputs, start_ns, time.time_ns(), os.getpid(), profiler.max_rss_mb()
+
+
+class CountryFanout:
+    # Builds the report levels of many countries on a process pool. Countries
+    # are submitted largest first, so the longest job does not start last.
+    def __init__(self, dataset_path, max_workers=None, chart_options=None, appendices=False, filters=None,
+                 approximate=False):
+        self.dataset_path = dataset_path
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chart_options = dict(chart_options or {})
+        # Images are always kept in memory in fan-out mode
+        self.chart_options.pop("write_files", None)
+        self.appendices = appendices
+        # DataProcessor.query arguments applied within every country
+        self.filters = filters or {}
+        self.approximate = approximate
+
+    def run(self, countries, levels, out_dir):
+        # countries: {country: row count}. Yields (country, outputs, None
+        # when the filters left no rows, or the exception that failed it) as
+        # countries finish.
+        order = sorted(countries, key=countries.get, reverse=True)
+        active = profiler.active()
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, len(order)) or 1,
+                                 initializer=_open_dataset, initargs=(self.dataset_path,)) as pool:
+            futures = {pool.submit(_build_country, country, out_dir, levels, self.chart_options,
+                                   self.appendices, self.filters, self.approximate): country for country in order}
+            for future in as_completed(futures):
+                country = futures[future]
+                try:
+                    outputs, start_ns, end_ns, pid, rss = future.result()
+                except Exception as e:
+                    yield country, e
+                    continue
+                if active is not None:
+                    active.add_event(f"country:{country}", start_ns, end_ns,
+                                     {"rows": int(countries[country]), "max_rss_mb": round(rss, 1),
+                                      "skipped": outputs is None},
+                                     pid=pid, tid=pid)
+                yield country, outputs
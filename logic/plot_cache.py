@@ -0,0 +1,93 @@
+import os
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+def _update_digest(digest, obj):
+    # Feeds a stable byte representation of chart inputs into the hash
+    if isinstance(obj, pd.DataFrame):
+        digest.update(repr((list(obj.columns), list(obj.dtypes))).encode())
+        digest.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, pd.Series):
+        digest.update(repr((obj.name, obj.dtype)).encode())
+        digest.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        digest.update(f"{obj.dtype}{obj.shape}".encode())
+        digest.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        for key in sorted(obj, key=repr):
+            digest.update(repr(key).encode())
+            _update_digest(digest, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        digest.update(f"{type(obj).__name__}{len(obj)}".encode())
+        for item in obj:
+            _update_digest(digest, item)
+    else:
+        digest.update(repr(obj).encode())
+
+
+class PlotCache:
+    # Content-addressed store of rendered charts, keyed on the chart's
+    # aggregated input data plus its style parameters. Entries are evicted
+    # least-recently-used first once the directory exceeds max_bytes.
+    def __init__(self, cache_dir=".cache/plots", max_bytes=200 * 1024 ** 2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, chart, data, style, version=""):
+        digest = hashlib.sha256()
+        digest.update(f"{chart.__module__}.{chart.__qualname__}:{version}".encode())
+        _update_digest(digest, style)
+        _update_digest(digest, data)
+        return digest.hexdigest()
+
+    def entry_path(self, key, ext):
+        return os.path.join(self.cache_dir, key + ext)
+
+    def lookup(self, key, ext):
+        entry = self.entry_path(key, ext)
+        if os.path.exists(entry):
+            self.hits += 1
+            # Touch the entry so eviction sees it as recently used
+            os.utime(entry)
+            return entry
+        self.misses += 1
+        return None
+
+    @staticmethod
+    def publish(entry, target):
+        # Expose a cache entry at the caller's path. A hard link makes this
+        # free, and it is skipped when the target already is that entry.
+        if os.path.exists(target):
+            if os.path.samefile(entry, target):
+                return target
+            os.remove(target)
+        try:
+            os.link(entry, target)
+        except OSError:
+            shutil.copyfile(entry, target)
+        return target
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isfile(path) and ".tmp" not in name:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0
+        return f"Plot cache: {self.hits} hits, {self.misses} misses ({rate:.0%} hit rate)"
@@ -0,0 +1,51 @@
+import numpy as np
+
+# Helpers that shrink row-level chart inputs to a size that does not grow
+# with the dataset. They only need numpy/pandas and run in the parent
+# process, so workers receive a few kilobytes instead of millions of rows.
+
+
+def binned_kde(values, bins=4096, gridsize=512, cut=3, bw_adjust=1.0):
+    # Gaussian KDE evaluated on a histogram with an FFT convolution: O(n) to
+    # bin plus O(bins log bins), instead of a kernel sum over every value.
+    # Scott's rule and cut=3 match seaborn.kdeplot's defaults.
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    n = len(values)
+    if n < 2:
+        return np.array([]), np.array([])
+    std = values.std(ddof=1)
+    bandwidth = (std if std > 0 else 1.0) * n ** (-1 / 5) * bw_adjust
+    low = values.min() - cut * bandwidth
+    high = values.max() + cut * bandwidth
+
+    counts, edges = np.histogram(values, bins=bins, range=(low, high))
+    delta = edges[1] - edges[0]
+    centers = edges[:-1] + delta / 2
+
+    half = min(bins, int(np.ceil(4 * bandwidth / delta)))
+    offsets = np.arange(-half, half + 1) * delta
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+    kernel /= kernel.sum()
+
+    size = bins + 2 * half
+    fft_size = 1 << int(np.ceil(np.log2(size)))
+    smoothed = np.fft.irfft(np.fft.rfft(counts, fft_size) * np.fft.rfft(kernel, fft_size), fft_size)
+    density = np.clip(smoothed[half:half + bins], 0, None) / (n * delta)
+
+    grid = np.linspace(low, high, gridsize)
+    return grid, np.interp(grid, centers, density)
+
+
+def stratified_sample(points, by, max_points=50_000, min_per_group=500, seed=0):
+    # Downsample to about max_points rows while keeping every group: each
+    # group keeps a share proportional to its size, but at least
+    # min_per_group rows. One Bernoulli draw per row with the group's keep
+    # rate, so the cost is a single vectorised pass.
+    if len(points) <= max_points:
+        return points
+    sizes = points[by].value_counts()
+    rate = (np.maximum(sizes * max_points / len(points), min_per_group) / sizes).clip(upper=1)
+    rng = np.random.default_rng(seed)
+    keep = rng.random(len(points)) < rate.reindex(points[by]).to_numpy(dtype=np.float64)
+    return points[keep]
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import resource
+import functools
+import threading
+import tracemalloc
+
+# Per-stage profiling. Every instrumented stage calls stage()/profiled(); when
+# profiling is off that is a single global check, so the instrumentation can
+# stay in production code.
+
+_active = None
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def max_rss_mb():
+    # Peak resident set size of this process (ru_maxrss is KB on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def stage(name, **args):
+    if _active is None:
+        return _NULL_SPAN
+    return _active.span(name, args)
+
+
+def profiled(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def active():
+    return _active
+
+
+def enable():
+    global _active
+    _active = Profiler()
+    return _active
+
+
+def disable():
+    global _active
+    profiler, _active = _active, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+class _Span:
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self.alloc_start = self.profiler.enter_alloc()
+        return self
+
+    def __exit__(self, *exc):
+        end_ns = time.time_ns()
+        alloc_delta, alloc_peak = self.profiler.exit_alloc(self.alloc_start)
+        self.profiler.add_event(self.name, self.start_ns, end_ns, dict(
+            self.args, alloc_mb=round(alloc_delta / 1024 ** 2, 2),
+            peak_alloc_mb=round(alloc_peak / 1024 ** 2, 2), max_rss_mb=round(max_rss_mb(), 1)))
+        return False
+
+
+class Profiler:
+    # Collects timed spans as Chrome trace events. Python allocations are
+    # counted with tracemalloc: each span records its net allocation and the
+    # peak traced memory reached while it was open.
+    def __init__(self):
+        self.events = []
+        self.origin_ns = time.time_ns()
+        # Open spans' allocation peaks, one stack per thread
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        tracemalloc.start()
+
+    def stop(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def span(self, name, args):
+        return _Span(self, name, args)
+
+    @property
+    def _peaks(self):
+        if not hasattr(self._local, "peaks"):
+            self._local.peaks = []
+        return self._local.peaks
+
+    def enter_alloc(self):
+        peaks = self._peaks
+        current, peak = tracemalloc.get_traced_memory()
+        if peaks:
+            # Keep the enclosing span's peak before resetting for this one
+            peaks[-1] = max(peaks[-1], peak)
+        tracemalloc.reset_peak()
+        peaks.append(current)
+        return current
+
+    def exit_alloc(self, start):
+        peaks = self._peaks
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(peaks.pop(), peak)
+        if peaks:
+            peaks[-1] = max(peaks[-1], peak)
+        tracemalloc.reset_peak()
+        return current - start, peak
+
+    def add_event(self, name, start_ns, end_ns, args, pid=None, tid=None):
+        # Also used for spans measured in worker processes
+        with self._lock:
+            self.events.append({
+                "name": name,
+                "cat": name.split(":", 1)[0],
+                "ph": "X",
+                "ts": (start_ns - self.origin_ns) / 1000,
+                "dur": (end_ns - start_ns) / 1000,
+                "pid": pid or os.getpid(),
+                "tid": tid or threading.get_ident(),
+                "args": args
+            })
+
+    def write_trace(self, path):
+        # Chrome trace format, readable by chrome://tracing and Perfetto
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+        return path
+
+    def summary(self):
+        totals = {}
+        for event in self.events:
+            row = totals.setdefault(event["name"], {"calls": 0, "ms": 0.0, "alloc": 0.0, "rss": 0.0})
+            row["calls"] += 1
+            row["ms"] += event["dur"] / 1000
+            row["alloc"] = max(row["alloc"], event["args"].get("peak_alloc_mb", 0))
+            row["rss"] = max(row["rss"], event["args"].get("max_rss_mb", 0))
+
+        lines = [f"{'Stage':<45}{'Calls':>6}{'Total ms':>12}{'Peak alloc MB':>15}{'Max RSS MB':>12}"]
+        for name, row in sorted(totals.items(), key=lambda item: item[1]["ms"], reverse=True):
+            lines.append(f"{name:<45}{row['calls']:>6}{row['ms']:>12.1f}{row['alloc']:>15.1f}{row['rss']:>12.1f}")
+        return "\n".join(lines)
@@ -1,3 +1,5 @@
+import io
+from xml.sax.saxutils import escape
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, Spacer, Image, PageBreak, KeepTogether
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.pagesizes import A4
@@ -6,42 +8,73 @@ from reportlab.lib.units import inch
 import pandas as pd
 from datetime import datetime
 from reportlab.lib.enums import TA_CENTER
+from reportlab import rl_config
+from logic.profiler import profiled, stage
+from logic.tables import dataframe_table
+
+# Embedded images are written as binary zlib streams. ASCII85 re-encoding
+# every image in every document dominated build time and made files larger.
+rl_config.useA85 = 0
+
+
+def _reset_layout_state(flowables):
+    # doc.build marks a flowable pushed to the next frame with _postponed and
+    # never clears it; shared flowables must be reset before the next document
+    for flowable in flowables:
+        flowable.__dict__.pop('_postponed', None)
+        _reset_layout_state(getattr(flowable, '_content', ()))
 
 class ReportGenerator:
-    def __init__(self):
-        styles = getSampleStyleSheet()
+    LEVEL_2_PLOTS = {
+        "country_revenue_plot": "Top 10 Countries by Revenue",
+        "monthly_revenue_plot": "Monthly Revenue Trend",
+        "product_quantity_plot": "Top 10 Products by Quantity Sold",
+        "top_customers_plot": "Top 10 Customers by Revenue"
+    }
+
+    LEVEL_3_PLOTS = {
+        "correlation_matrix_plot": "Correlation Heatmap of Numeric Features",
+        "revenue_kde_plot": "Revenue Distribution (KDE Plot)",
+        "scatter_quantity_revenue_plot": "Quantity vs Revenue by Country"
+    }
+
+    def __init__(self, country=None):
+        # Reports limited to one country name it on the title page
+        self.country = country
+        # Styles are created once and shared by every section and document
+        self.styles = getSampleStyleSheet()
+        self.title_style = ParagraphStyle(name='TitleStyle', parent=self.styles['Title'], alignment=1)
+        self.info_style = ParagraphStyle(name='InfoStyle', parent=self.styles['Normal'], alignment=1)
         self.centered_heading1 = ParagraphStyle(
             name='CenteredHeading1',
-            parent=styles['Heading1'],
+            parent=self.styles['Heading1'],
             alignment=TA_CENTER
         )
         self.centered_heading2 = ParagraphStyle(
             name='CenteredHeading2',
-            parent=styles['Heading2'],
+            parent=self.styles['Heading2'],
             alignment=TA_CENTER
         )
 
     def _build_title_page(self):
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(name='TitleStyle', parent=styles['Title'], alignment=1)
-        info_style = ParagraphStyle(name='InfoStyle', parent=styles['Normal'], alignment=1)
-
         story = []
         story.append(Spacer(1, 100))
-        story.append(Paragraph("Sales Data Analysis Report – Online Retail", title_style))
+        story.append(Paragraph("Sales Data Analysis Report – Online Retail", self.title_style))
         story.append(Spacer(1, 40))
-        story.append(Paragraph(f"Author: Sreekala Menon", info_style))
+        story.append(Paragraph(f"Author: Sreekala Menon", self.info_style))
         story.append(Spacer(1, 10))
-        story.append(Paragraph(f"Date Generated: {datetime.today().strftime('%B %d, %Y')}", info_style))
+        story.append(Paragraph(f"Date Generated: {datetime.today().strftime('%B %d, %Y')}", self.info_style))
         story.append(Spacer(1, 10))
-        story.append(Paragraph("Data Source: UCI Machine Learning Repository", info_style))
+        story.append(Paragraph("Data Source: UCI Machine Learning Repository", self.info_style))
+        if self.country is not None:
+            story.append(Spacer(1, 10))
+            story.append(Paragraph(f"Country: {escape(self.country)}", self.info_style))
         story.append(PageBreak())
         return story
 
     def _build_level_1_content(self, data):
-        styles = getSampleStyleSheet()
+        styles = self.styles
         normal_style = styles["BodyText"]
-        heading_style = ParagraphStyle(name='CenteredHeading1', parent=styles['Heading1'], alignment=1)
         story = []
 
         # Add heading
@@ -97,6 +130,9 @@ class ReportGenerator:
             ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold')
         ])
         story.append(kpi_table)
+        if data.get("approximation_note"):
+            story.append(Spacer(1, 6))
+            story.append(Paragraph(data["approximation_note"], styles["Italic"]))
         story.append(Spacer(1, 12))
 
         # Interesting Facts
@@ -108,131 +144,134 @@ class ReportGenerator:
 
         return story
 
-    def generate_level_1_report(self, data, output_file):
-        doc = SimpleDocTemplate(output_file, pagesize=A4)
-        story = self._build_title_page() + self._build_level_1_content(data)
-        doc.build(story)
-
-    def generate_level_2_report(self, data_level1, data_level2, output_file):
-        doc = SimpleDocTemplate(output_file, pagesize=A4)
-        story = self._build_title_page() + self._build_level_1_content(data_level1)
-
-        #styles = getSampleStyleSheet()
-        story.append(Spacer(1, 12))
-        story.append(PageBreak())
-        story.append(Spacer(1, 24))
-        story.append(Paragraph("LEVEL-2 ANALYSIS", self.centered_heading1))
-        story.append(Spacer(1, 12))
-
-        plot_titles = {
-            "country_revenue_plot": "Top 10 Countries by Revenue",
-            "monthly_revenue_plot": "Monthly Revenue Trend",
-            "product_quantity_plot": "Top 10 Products by Quantity Sold",
-            "top_customers_plot": "Top 10 Customers by Revenue"
-        }
-
-        for key, title in plot_titles.items():
-            if key in data_level2:
+    @staticmethod
+    def _as_frame(source):
+        # Tables are passed as DataFrames; CSV paths are still accepted
+        return source if isinstance(source, pd.DataFrame) else pd.read_csv(source)
+
+    @staticmethod
+    def _image_source(image):
+        # Charts arrive as file paths, or as encoded bytes when they were
+        # rendered in memory
+        if isinstance(image, (bytes, bytearray)):
+            return io.BytesIO(image)
+        return image
+
+    def _build_plot_blocks(self, plots, titles):
+        # Each Image flowable is created once per section; documents sharing
+        # the section reuse it, so the image is only decoded once
+        story = []
+        for key, title in titles.items():
+            if key in plots:
                 block = KeepTogether([
                     Paragraph(f"{title}", self.centered_heading2),
                     Spacer(1, 6),
-                    Image(data_level2[key], width=6.0*inch, height=3.5*inch),
+                    Image(self._image_source(plots[key]), width=6.0*inch, height=3.5*inch),
                     Spacer(1, 12)
                 ])
                 story.append(block)
+        return story
 
-        doc.build(story)
-
-    def generate_level_3_report(self, data_level1, data_level2, data_level3, output_file):
-        doc = SimpleDocTemplate(output_file, pagesize=A4)
-        story = self._build_title_page() + self._build_level_1_content(data_level1)
-        styles = getSampleStyleSheet()
-
-        # LEVEL 2 SECTION
+    def _build_level_2_content(self, data_level2):
+        story = []
+        story.append(Spacer(1, 12))
         story.append(PageBreak())
         story.append(Spacer(1, 24))
-        story.append(Paragraph("LEVEL-2 ANALYSIS", styles["Heading1"]))
+        story.append(Paragraph("LEVEL-2 ANALYSIS", self.centered_heading1))
         story.append(Spacer(1, 12))
+        return story + self._build_plot_blocks(data_level2, self.LEVEL_2_PLOTS)
 
-        plot_titles_level2 = {
-            "country_revenue_plot": "Top 10 Countries by Revenue",
-            "monthly_revenue_plot": "Monthly Revenue Trend",
-            "product_quantity_plot": "Top 10 Products by Quantity Sold",
-            "top_customers_plot": "Top 10 Customers by Revenue"
-        }
-
-        for key, title in plot_titles_level2.items():
-            if key in data_level2:
-                block = KeepTogether([
-                    Paragraph(f"{title}", self.centered_heading2),
-                    Spacer(1, 6),
-                    Image(data_level2[key], width=6.0*inch, height=3.5*inch),
-                    Spacer(1, 12)
-                ])
-                story.append(block)
-
-        # LEVEL 3 SECTION
+    def _build_level_3_content(self, data_level3):
+        styles = self.styles
+        story = []
         story.append(PageBreak())
         story.append(Spacer(1, 24))
         story.append(Paragraph("LEVEL-3 ANALYSIS", self.centered_heading1))
         story.append(Spacer(1, 12))
-
-        plot_titles_level3 = {
-            "correlation_matrix_plot": "Correlation Heatmap of Numeric Features",
-            "revenue_kde_plot": "Revenue Distribution (KDE Plot)",
-            "scatter_quantity_revenue_plot": "Quantity vs Revenue by Country"
-        }
-
-        for key, title in plot_titles_level3.items():
-            if key in data_level3:
-                block = KeepTogether([
-                    Paragraph(f"{title}", self.centered_heading2),
-                    Spacer(1, 6),
-                    Image(data_level3[key], width=6.0*inch, height=3.5*inch),
-                    Spacer(1, 12)
-                ])
-                story.append(block)
+        story += self._build_plot_blocks(data_level3, self.LEVEL_3_PLOTS)
 
         # KPI Trend Table
-        if "monthly_kpi_csv" in data_level3:
+        monthly_kpis = data_level3.get("monthly_kpis", data_level3.get("monthly_kpi_csv"))
+        if monthly_kpis is not None:
             story.append(PageBreak())
             story.append(Paragraph("Monthly KPI Trends", styles["Heading1"]))
             story.append(Spacer(1, 6))
-
-            df_kpi = pd.read_csv(data_level3["monthly_kpi_csv"])
-            kpi_table_data = [df_kpi.columns.tolist()] + df_kpi.values.tolist()
-            table_data = [
-                [Paragraph(str(cell), styles["BodyText"]) for cell in row]
-                for row in kpi_table_data
-            ]
-
-            kpi_table = Table(table_data, hAlign='LEFT', colWidths=[80, 100, 120, 120])
-            kpi_table.setStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold')
-            ])
-            story.append(kpi_table)
+            df_kpi = self._as_frame(monthly_kpis)
+            story.append(dataframe_table(df_kpi, font_size=10, formats={
+                "Revenue": "£{:,.2f}", "AOV": "£{:,.2f}", "MoM Change": "{:+.1%}"}))
 
         # Revenue Outlier Table
-        if "revenue_outliers_csv" in data_level3:
+        revenue_outliers = data_level3.get("revenue_outliers", data_level3.get("revenue_outliers_csv"))
+        if revenue_outliers is not None:
             story.append(PageBreak())
             story.append(Paragraph("High Revenue Outliers", styles["Heading1"]))
             story.append(Spacer(1, 6))
+            story.append(Paragraph("Invoices above Q3 + 1.5 × IQR of their country and month, "
+                                   "with their z-score in that group. Top 10 by revenue.",
+                                   styles["BodyText"]))
+            story.append(Spacer(1, 6))
+            df_outliers = self._as_frame(revenue_outliers).head(10)
+            story.append(dataframe_table(df_outliers, font_size=10, formats={
+                "Revenue": "£{:,.2f}", "Z-Score": "{:.1f}"}))
 
-            df_outliers = pd.read_csv(data_level3["revenue_outliers_csv"]).head(10)
-            outlier_data = [df_outliers.columns.tolist()] + df_outliers.values.tolist()
-            table_data = [
-                [Paragraph(str(cell), styles["BodyText"]) for cell in row]
-                for row in outlier_data
-            ]
-
-            outlier_table = Table(table_data, hAlign='LEFT', colWidths=[80, 100, 100, 100])
-            outlier_table.setStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold')
-            ])
-            story.append(outlier_table)
-
-        doc.build(story)
+        # Customer Analytics
+        customer_segments = data_level3.get("customer_segments")
+        if customer_segments is not None:
+            story.append(PageBreak())
+            story.append(Paragraph("Customer Segments (RFM)", styles["Heading1"]))
+            story.append(Spacer(1, 6))
+            story.append(Paragraph("Every customer is scored 1-5 on Recency (days since the last purchase), "
+                                   "Frequency (invoices) and Monetary value (revenue) by quintile, and "
+                                   "segmented on the recency and frequency scores. Recency and Frequency "
+                                   "below are segment averages.", styles["BodyText"]))
+            story.append(Spacer(1, 6))
+            story.append(dataframe_table(self._as_frame(customer_segments), font_size=9, formats={
+                "Customer Share": "{:.1%}", "Revenue": "£{:,.0f}", "Revenue Share": "{:.1%}",
+                "Recency": "{:,.0f}", "Frequency": "{:,.1f}"}))
+
+        top_customers = data_level3.get("top_customers_by_country")
+        if top_customers is not None:
+            story.append(Spacer(1, 18))
+            story.append(Paragraph("Top Customers in the Top 5 Countries", styles["Heading2"]))
+            story.append(Spacer(1, 6))
+            story.append(dataframe_table(self._as_frame(top_customers), font_size=10, formats={
+                "Revenue": "£{:,.2f}"}))
+
+        # Appendices: full-length tables, split across as many pages as needed
+        for title, df in data_level3.get("appendices", {}).items():
+            story.append(PageBreak())
+            story.append(Paragraph(f"Appendix – {title}", styles["Heading1"]))
+            story.append(Spacer(1, 6))
+            story.append(dataframe_table(df))
+
+        return story
+
+    @profiled("report:generate")
+    def generate_reports(self, outputs, data_level1, data_level2=None, data_level3=None):
+        # outputs: {level: output file}. Level n's story is the first n
+        # sections, and each section is built once for all requested levels.
+        with stage("report:sections"):
+            sections = [self._build_title_page() + self._build_level_1_content(data_level1)]
+            if max(outputs) >= 2:
+                sections.append(self._build_level_2_content(data_level2))
+            if 3 in outputs:
+                sections.append(self._build_level_3_content(data_level3))
+
+        for level, output_file in sorted(outputs.items()):
+            doc = SimpleDocTemplate(output_file, pagesize=A4)
+            # doc.build consumes the list it is given, so every document gets
+            # its own list of the shared flowables
+            story = [flowable for section in sections[:level] for flowable in section]
+            _reset_layout_state(story)
+            with stage(f"report:level_{level}"):
+                doc.build(story)
+        return outputs
+
+    def generate_level_1_report(self, data, output_file):
+        self.generate_reports({1: output_file}, data)
+
+    def generate_level_2_report(self, data_level1, data_level2, output_file):
+        self.generate_reports({2: output_file}, data_level1, data_level2)
+
+    def generate_level_3_report(self, data_level1, data_level2, data_level3, output_file):
+        self.generate_reports({3: output_file}, data_level1, data_level2, data_level3)
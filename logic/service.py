@@ -0,0 +1,221 @@
+import io
+import json
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, unquote
+import numpy as np
+from logic.report_generator import ReportGenerator
+
+# Local HTTP service over one loaded dataset. The cleaned frame, its
+# aggregates and level results stay in memory between requests:
+#   GET /kpis                 level-1 KPIs as JSON
+#   GET /tables/<name>        a report table as JSON records
+#   GET /charts/<plot key>    one chart image, e.g. /charts/monthly_revenue_plot
+#   GET /reports/level<N>.pdf the level-N PDF
+# Identical requests in flight share one computation, and encoded responses
+# are kept in an LRU bounded in bytes. JSON is served from its own thread, so
+# it does not queue behind chart and PDF builds.
+
+CONTENT_TYPES = {"png": "image/png", "jpg": "image/jpeg"}
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error"}
+
+# Aggregates that can be fetched from /tables/<name>
+TABLES = ("monthly_kpis", "revenue_outliers", "customer_segments", "top_customers_by_country",
+          "product_summary")
+
+
+class NotFound(Exception):
+    pass
+
+
+def _json_default(value):
+    # numpy scalars and timestamps in KPI dicts
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _json(data):
+    return "application/json", json.dumps(data, default=_json_default).encode()
+
+
+class ResponseCache:
+    # Least-recently-used cache of (content type, body) pairs, bounded by the
+    # total size of the bodies. A body larger than the budget is not kept.
+    def __init__(self, max_bytes=64 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        if len(entry[1]) > self.max_bytes:
+            return
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key)[1])
+        self.entries[key] = entry
+        self.size += len(entry[1])
+        while self.size > self.max_bytes:
+            _, (_, body) = self.entries.popitem(last=False)
+            self.size -= len(body)
+
+
+class ReportService:
+    # processor: a DataProcessor whose renderer returns images as bytes
+    def __init__(self, processor, final_count, cache_bytes=64 * 1024 ** 2):
+        self.processor = processor
+        self.final_count = final_count
+        self.report_generator = ReportGenerator()
+        self.cache = ResponseCache(cache_bytes)
+        self.inflight = {}
+        # Computations run off the event loop. Charts and PDFs are built on
+        # one thread, since level results are memoized without a lock, and
+        # render in parallel on the renderer's process pool. KPIs and tables
+        # only need aggregates, which DataProcessor computes under a lock, so
+        # they have a thread of their own.
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report")
+        self.json_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="json")
+
+    def _route(self, path):
+        # Returns (cache key, function computing (content type, body), the
+        # executor to run it on), or raises NotFound for unknown paths
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if parts == ["kpis"]:
+            return "kpis", self._kpis, self.json_executor
+        if len(parts) == 2 and parts[0] == "tables" and parts[1] in TABLES:
+            return path, lambda: self._table(parts[1]), self.json_executor
+        if len(parts) == 2 and parts[0] == "charts":
+            return path, lambda: self._chart(parts[1]), self.executor
+        if len(parts) == 2 and parts[0] == "reports" and parts[1] in ("level1.pdf", "level2.pdf", "level3.pdf"):
+            return path, lambda: self._report(int(parts[1][5])), self.executor
+        raise NotFound(f"no such resource '{path}'")
+
+    def _kpis(self):
+        kpis = dict(self.processor.aggregate("kpi_values"), final_count=self.final_count)
+        return _json(kpis)
+
+    def _table(self, name):
+        table = self.processor.aggregate(name)
+        if table is None:
+            raise NotFound(f"table '{name}' is not available for this dataset")
+        return "application/json", table.to_json(orient="records", date_format="iso").encode()
+
+    def _chart(self, key):
+        # Renders only this chart, unless its whole level was built already
+        if key not in self.processor.LEVEL_2_CHARTS and key not in self.processor.LEVEL_3_CHARTS:
+            raise NotFound(f"no such chart '{key}'")
+        image = self.processor.chart(key)
+        if image is None:
+            raise NotFound(f"chart '{key}' is not available for this dataset")
+        return CONTENT_TYPES[self.processor.renderer.output[0]], image
+
+    def _report(self, level):
+        dp = self.processor
+        report_data_l1 = dp._handle_level_1(self.final_count)
+        report_data_l2 = dp._handle_level_2() if level >= 2 else None
+        report_data_l3 = dp._handle_level_3() if level == 3 else None
+        buffer = io.BytesIO()
+        self.report_generator.generate_reports({level: buffer}, report_data_l1, report_data_l2, report_data_l3)
+        return "application/pdf", buffer.getvalue()
+
+    async def fetch(self, key, compute, executor=None):
+        # Returns ((content type, body), "hit" | "coalesced" | "miss")
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry, "hit"
+        future = self.inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future), "coalesced"
+
+        future = asyncio.get_running_loop().run_in_executor(executor or self.executor, compute)
+        self.inflight[key] = future
+
+        def finished(future):
+            # Cached here rather than by the first caller, which may have
+            # disconnected while the others still wait
+            self.inflight.pop(key, None)
+            if not future.cancelled() and future.exception() is None:
+                self.cache.put(key, future.result())
+
+        future.add_done_callback(finished)
+        return await asyncio.shield(future), "miss"
+
+    async def respond(self, method, target):
+        # Returns (status, content type, body, cache status)
+        if method not in ("GET", "HEAD"):
+            return (405,) + _json({"error": f"method {method} not allowed"}) + ("",)
+        path = urlsplit(target).path
+        if path in ("/", "/health"):
+            return (200,) + _json({"status": "ok", "rows": self.final_count}) + ("",)
+        try:
+            key, compute, executor = self._route(path)
+            (content_type, body), cache_status = await self.fetch(key, compute, executor)
+        except NotFound as e:
+            return (404,) + _json({"error": str(e)}) + ("",)
+        except Exception as e:
+            print(f"❌ Error: {method} {path} failed: {e}")
+            return (500,) + _json({"error": str(e)}) + ("",)
+        return 200, content_type, body, cache_status
+
+    async def _handle(self, reader, writer):
+        # HTTP/1.1 with keep-alive; request bodies are ignored
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if int(headers.get("content-length", 0) or 0):
+                    await reader.readexactly(int(headers["content-length"]))
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    status, content_type, body, cache_status = (400,) + _json({"error": "bad request"}) + ("",)
+                    method, version = "GET", "HTTP/1.0"
+                else:
+                    method, target, version = parts
+                    status, content_type, body, cache_status = await self.respond(method, target)
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                head = [f"HTTP/1.1 {status} {REASONS[status]}",
+                        f"Content-Type: {content_type}",
+                        f"Content-Length: {len(body)}",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                if cache_status:
+                    head.append(f"X-Cache: {cache_status}")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # Dropped connections and oversized or malformed requests
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self, host="127.0.0.1", port=8050):
+        server = await asyncio.start_server(self._handle, host, port)
+        address = server.sockets[0].getsockname()
+        print(f"🌐 Serving reports on http://{address[0]}:{address[1]} (Ctrl+C to stop)")
+        async with server:
+            await server.serve_forever()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.json_executor.shutdown(wait=False, cancel_futures=True)
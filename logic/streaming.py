@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+from logic.data_cleaner import DataCleaner
+from logic.data_loader import USE_COLUMNS, COLUMN_DTYPES, DATE_COLUMNS
+from logic.sketches import build_sketches, merge_sketches
+
+# Columns whose pairwise correlation is shown in the level-3 heatmap
+CORRELATION_COLUMNS = ['Quantity', 'Price', 'Revenue']
+CELL_KEYS = ['Month', 'Country', 'Description']
+
+
+def iter_chunks(path, chunk_size=500_000):
+    # Yields raw frames of at most chunk_size rows from a CSV or Parquet file
+    if path.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        columns = [c for c in USE_COLUMNS if c in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    elif path.lower().endswith(".csv"):
+        yield from pd.read_csv(path, usecols=USE_COLUMNS, dtype=COLUMN_DTYPES,
+                               parse_dates=DATE_COLUMNS, chunksize=chunk_size)
+    else:
+        raise ValueError(f"streaming mode needs a .csv or .parquet file, got '{path}'")
+
+
+class PartialAggregates:
+    # Mergeable summary of a slice of the cleaned data. Every field combines
+    # associatively, so chunks (or workers) can be folded in any order and
+    # memory depends on the number of distinct keys, not on the row count.
+    def __init__(self, sample_size=200_000, approximate=False):
+        self.sample_size = sample_size
+        # Approximate mode keeps HyperLogLog/KLL sketches instead of the
+        # distinct invoice and customer id sets
+        self.approximate = approximate
+        self.sketches = None
+        self.initial_count = 0
+        self.final_count = 0
+        # Revenue, Quantity and line counts by Month x Country x Description
+        self.cells = pd.DataFrame(columns=['Revenue', 'Quantity', 'Lines'],
+                                  index=pd.MultiIndex.from_arrays([[], [], []], names=CELL_KEYS))
+        self.invoices = np.array([], dtype=object)
+        self.customers = np.array([], dtype=np.int64)
+        # Count, means and centred cross-products for the correlation matrix
+        self.n = 0
+        self.mean = np.zeros(len(CORRELATION_COLUMNS))
+        self.comoment = np.zeros((len(CORRELATION_COLUMNS), len(CORRELATION_COLUMNS)))
+        # Bottom-k sample by random priority: a uniform sample that stays
+        # uniform after merging. Used by the KDE and scatter charts.
+        self.sample = None
+
+    @classmethod
+    def from_chunk(cls, raw, rng, sample_size=200_000, approximate=False):
+        return cls.from_clean(DataCleaner(verbose=False).clean(raw), int(raw['Invoice'].count()),
+                              rng, sample_size, approximate)
+
+    @classmethod
+    def from_clean(cls, df, initial_count, rng, sample_size=200_000, approximate=False):
+        part = cls(sample_size, approximate)
+        part.initial_count = initial_count
+        part.final_count = int(df['Invoice'].count())
+        if df.empty:
+            return part
+
+        month = df['InvoiceDate'].dt.to_period('M').astype(str).rename('Month')
+        part.cells = df.groupby([month, df['Country'].astype(str), df['Description'].astype(str)]).agg(
+            Revenue=('Revenue', 'sum'), Quantity=('Quantity', 'sum'), Lines=('Revenue', 'size'))
+        part.cells.index.names = CELL_KEYS
+        if approximate:
+            part.sketches = build_sketches(df, seed=int(rng.integers(2 ** 31)))
+        else:
+            part.invoices = df['Invoice'].astype(str).unique().astype(object)
+            part.customers = df['Customer ID'].unique().astype(np.int64)
+
+        values = df[CORRELATION_COLUMNS].to_numpy(dtype=np.float64)
+        part.n = len(values)
+        part.mean = values.mean(axis=0)
+        centred = values - part.mean
+        part.comoment = centred.T @ centred
+
+        sample = df.assign(_priority=rng.random(len(df)))
+        part.sample = sample.nsmallest(sample_size, '_priority')
+        return part
+
+    def merge(self, other):
+        self.initial_count += other.initial_count
+        self.final_count += other.final_count
+        if other.n == 0:
+            return self
+
+        if self.cells.empty:
+            self.cells = other.cells
+        else:
+            self.cells = pd.concat([self.cells, other.cells]).groupby(level=CELL_KEYS).sum()
+        if self.approximate:
+            self.sketches = other.sketches if self.sketches is None else merge_sketches(self.sketches, other.sketches)
+        else:
+            self.invoices = np.union1d(self.invoices, other.invoices)
+            self.customers = np.union1d(self.customers, other.customers)
+
+        # Chan et al. pairwise update of means and co-moments
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.comoment = self.comoment + other.comoment + np.outer(delta, delta) * self.n * other.n / n
+        self.mean = self.mean + delta * other.n / n
+        self.n = n
+
+        if self.sample is None:
+            self.sample = other.sample
+        else:
+            self.sample = pd.concat([self.sample, other.sample], ignore_index=True).nsmallest(
+                self.sample_size, '_priority')
+        return self
+
+    def correlation(self):
+        std = np.sqrt(np.diag(self.comoment))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = self.comoment / np.outer(std, std)
+        return pd.DataFrame(corr, index=CORRELATION_COLUMNS, columns=CORRELATION_COLUMNS)
+
+    def sample_frame(self):
+        if self.sample is None:
+            return pd.DataFrame(columns=USE_COLUMNS + ['Revenue'])
+        return self.sample.drop(columns='_priority').reset_index(drop=True)
+
+    def to_aggregates(self):
+        # Same names and shapes as DataProcessor.AGGREGATES, so the level
+        # handlers build reports from these instead of from raw rows
+        cells = self.cells
+        total_revenue = cells['Revenue'].sum()
+        by_country = cells.groupby(level='Country')
+        by_product = cells.groupby(level='Description')
+        sample = self.sample_frame()
+
+        if self.approximate:
+            total_transactions = self.sketches["invoices"].count()
+            unique_customers = self.sketches["customers"].count()
+            # The KLL sketch saw every row, not just the sample
+            revenue_p99 = self.sketches["revenue"].quantile(0.99)
+        else:
+            total_transactions = len(self.invoices)
+            unique_customers = len(self.customers)
+            # Estimated from the uniform sample
+            revenue_p99 = sample['Revenue'].quantile(0.99) if len(sample) else 0.0
+
+        aggregates = {
+            "kpi_values": {
+                "total_transactions": total_transactions,
+                "total_revenue": total_revenue,
+                "avg_revenue": total_revenue / total_transactions if total_transactions else 0,
+                "unique_customers": unique_customers
+            },
+            "country_revenue": by_country['Revenue'].sum().sort_values(ascending=False),
+            "monthly_revenue": cells.groupby(level='Month')['Revenue'].sum(),
+            "product_quantity": by_product['Quantity'].sum().sort_values(ascending=False),
+            "product_counts": by_product['Lines'].sum().sort_values(ascending=False),
+            "country_counts": by_country['Lines'].sum().sort_values(ascending=False),
+            "correlation": self.correlation(),
+            "revenue_p99": revenue_p99,
+            "product_summary": by_product[['Quantity', 'Revenue', 'Lines']].sum()
+                                .astype({'Quantity': 'int64', 'Lines': 'int64'})
+                                .sort_values('Revenue', ascending=False).reset_index(),
+            # Need per-invoice and per-customer data, which is not kept
+            "monthly_kpis": None,
+            "revenue_outliers": None,
+            "customer_rfm": None,
+            "customer_segments": None,
+            "top_customers": None,
+            "top_customers_by_country": None
+        }
+        if self.approximate:
+            aggregates["sketches"] = self.sketches
+        return aggregates
+
+
+class StreamingAggregator:
+    def __init__(self, path, chunk_size=500_000, sample_size=200_000, seed=0, approximate=False):
+        self.path = path
+        self.approximate = approximate
+        self.chunk_size = chunk_size
+        self.sample_size = sample_size
+        self.seed = seed
+
+    def run(self):
+        # Peak memory is one raw chunk plus the running aggregates
+        rng = np.random.default_rng(self.seed)
+        total = PartialAggregates(self.sample_size, self.approximate)
+        for chunk in iter_chunks(self.path, self.chunk_size):
+            chunk.columns = chunk.columns.str.strip()
+            total.merge(PartialAggregates.from_chunk(chunk, rng, self.sample_size, self.approximate))
+        return total
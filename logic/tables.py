@@ -0,0 +1,160 @@
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import Flowable
+
+# Page-splitting tables built straight from DataFrames. Cells are plain
+# strings, which ReportLab lays out far faster than one Paragraph per cell,
+# and every row has a fixed height, so no cell has to be measured. Text too
+# wide for its column is cut short with an ellipsis instead of wrapping.
+
+FONT = "Helvetica"
+BOLD_FONT = "Helvetica-Bold"
+H_PADDING = 4
+V_PADDING = 2
+ELLIPSIS = "\u2026"
+
+
+def format_frame(df, formats=None):
+    # Every column as strings. formats maps a column to a format string such
+    # as "{:,.2f}" or to a function; other float columns get two decimals.
+    formats = formats or {}
+    text = {}
+    for column in df.columns:
+        values = df[column]
+        fmt = formats.get(column)
+        if fmt is None and pd.api.types.is_float_dtype(values):
+            fmt = "{:,.2f}"
+        if fmt is None:
+            text[column] = values.astype(str)
+        else:
+            text[column] = values.map(fmt if callable(fmt) else fmt.format)
+        text[column] = text[column].where(values.notna(), "")
+    return pd.DataFrame(text, index=df.index)
+
+
+def column_widths(text, font_size, available_width=None):
+    # Width of each column's longest string (and of its header), scaled down
+    # proportionally when the table would not fit available_width
+    widths = []
+    for column in text.columns:
+        values = text[column]
+        longest = values.iloc[values.str.len().to_numpy().argmax()] if len(values) else ""
+        widths.append(max(stringWidth(longest, FONT, font_size),
+                          stringWidth(str(column), BOLD_FONT, font_size)) + 2 * H_PADDING)
+    total = sum(widths)
+    if available_width and total > available_width:
+        widths = [width * available_width / total for width in widths]
+    return widths
+
+
+def _clip(value, width, font, font_size):
+    # value cut to the longest prefix that fits width with an ellipsis
+    if stringWidth(value, font, font_size) <= width:
+        return value
+    lo, hi = 0, len(value)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if stringWidth(value[:mid] + ELLIPSIS, font, font_size) <= width:
+            lo = mid
+        else:
+            hi = mid - 1
+    return value[:lo].rstrip() + ELLIPSIS
+
+
+def clip_text(text, widths, font_size):
+    # Cells (and headers) wider than their column, once padded, are clipped.
+    # Columns whose longest string fits are left alone, as in column_widths.
+    text = text.copy()
+    header = []
+    for column, width in zip(text.columns, widths):
+        room = width - 2 * H_PADDING
+        header.append(_clip(str(column), room, BOLD_FONT, font_size))
+        values = text[column]
+        if not len(values):
+            continue
+        longest = values.iloc[values.str.len().to_numpy().argmax()]
+        if stringWidth(longest, FONT, font_size) <= room:
+            continue
+        clipped = {value: _clip(value, room, FONT, font_size) for value in pd.unique(values)}
+        text[column] = values.map(clipped)
+    return header, text
+
+
+class DataFrameTable(Flowable):
+    # A table over a whole frame that is laid out one page at a time. Each
+    # split hands the rows that did not fit on as a numpy view, so the cost
+    # is linear in the row count (ReportLab's Table rebuilds the remainder,
+    # with a style object per cell, on every page).
+    # Rows are drawn directly, one text object per column.
+    def __init__(self, header, rows, widths, font_size=8):
+        Flowable.__init__(self)
+        self.hAlign = 'LEFT'
+        self.header = header
+        self.rows = rows
+        self.widths = widths
+        self.font_size = font_size
+        self.leading = font_size + 2
+        self.row_height = self.leading + 2 * V_PADDING
+
+    def _fits(self, availHeight):
+        # Rows that fit under the header
+        return max(0, int((availHeight - self.row_height) // self.row_height))
+
+    def wrap(self, availWidth, availHeight):
+        self.width = sum(self.widths)
+        self.height = (len(self.rows) + 1) * self.row_height
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        stop = min(len(self.rows), self._fits(availHeight))
+        if stop == 0:
+            return []
+        return [DataFrameTable(self.header, self.rows[:stop], self.widths, self.font_size),
+                DataFrameTable(self.header, self.rows[stop:], self.widths, self.font_size)]
+
+    def draw(self):
+        canv = self.canv
+        width, height, row_height = sum(self.widths), self.height, self.row_height
+        canv.saveState()
+        canv.setFillColor(colors.lightgrey)
+        canv.rect(0, height - row_height, width, row_height, stroke=0, fill=1)
+
+        # Grid: one path for every row and column line
+        canv.setStrokeColor(colors.grey)
+        canv.setLineWidth(0.5)
+        grid = canv.beginPath()
+        for i in range(len(self.rows) + 2):
+            grid.moveTo(0, height - i * row_height)
+            grid.lineTo(width, height - i * row_height)
+        x = 0
+        for column_width in list(self.widths) + [0]:
+            grid.moveTo(x, 0)
+            grid.lineTo(x, height)
+            x += column_width
+        canv.drawPath(grid, stroke=1, fill=0)
+
+        canv.setFillColor(colors.black)
+        baseline = height - V_PADDING - self.font_size
+        x = 0
+        for j, column_width in enumerate(self.widths):
+            canv.setFont(BOLD_FONT, self.font_size)
+            canv.drawString(x + H_PADDING, baseline, self.header[j])
+            text = canv.beginText(x + H_PADDING, baseline - row_height)
+            text.setFont(FONT, self.font_size, row_height)
+            text.textLines(list(self.rows[:, j]), trim=0)
+            canv.drawText(text)
+            x += column_width
+        canv.restoreState()
+
+
+def dataframe_table(df, col_widths=None, formats=None, font_size=8, available_width=451,
+                    max_rows=None):
+    # A table that splits across pages and repeats its header row on each.
+    # available_width defaults to an A4 frame with the standard margins.
+    if max_rows is not None:
+        df = df.head(max_rows)
+    text = format_frame(df, formats)
+    widths = col_widths or column_widths(text, font_size, available_width)
+    header, text = clip_text(text, widths, font_size)
+    return DataFrameTable(header, text.to_numpy(dtype=object), widths, font_size)
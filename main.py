@@ -1,34 +1,69 @@
 from abstract_base import BaseAnalysis
 from logic.data_processor import DataProcessor
-from logic.report_generator import ReportGenerator
-import pandas as pd
+from logic.data_cache import DatasetCache
+from logic.cube import AggregateCube
+from logic.data_loader import DataLoader
+from logic.data_cleaner import DataCleaner
+from logic.charts import ChartRenderer
+from logic.plot_cache import PlotCache
+from logic.streaming import StreamingAggregator
+from logic.aggregate_store import AggregateStore
+from logic import profiler
+from logic.profiler import stage
+import argparse
 import sys
 import os
 
 class Analysis(BaseAnalysis): 
 
-    def __init__(self):
+    def __init__(self, rebuild_cache=False, extra_pattern=None, workers=None,
+                 plot_cache=True, plot_cache_mb=200, stream_source=None, chunk_size=500_000,
+                 store_dir=None, ingest=(), approximate=False, write_assets=True,
+                 image_format="png", dpi=None, appendices=False, filters=None):
+        self.approximate = approximate
+        # DataProcessor.query arguments: reports cover only the matching rows
+        self.filters = filters or {}
+        self.appendices = appendices
+        # Without write_assets, charts are handed to the PDFs as in-memory
+        # images and nothing is written to assets/
+        self.chart_options = {"image_format": image_format, "dpi": dpi, "write_files": write_assets}
+        self.plot_cache = PlotCache(max_bytes=plot_cache_mb * 1024 ** 2) if plot_cache else None
+        # Created with the first report and reused for the whole session
+        self.report_generator = None
+        self.aggregates = None
+        # Memory-mapped Arrow copy of self.df, shared with --by-country workers
+        self.dataset_path = None
+        # Month x Country x Product cube of self.df, persisted next to it
+        self.cube = None
+        if stream_source:
+            self._load_streaming(stream_source, chunk_size)
+            return
+        if store_dir or ingest:
+            self._load_store(store_dir or ".cache/aggregates", ingest)
+            return
         # logic for dataset load into dataframe
         filename = './online_retail_II.xlsx'
-        try:                
-            df_1 = pd.read_excel(filename,sheet_name="Year 2009-2010")
-            df_2 = pd.read_excel(filename,sheet_name="Year 2010-2011")
-            df = pd.concat([df_1,df_2], ignore_index=True)
-
-            df.columns = df.columns.str.strip()
-            # initial count of records
-            self.initial_count = df['Invoice'].count()
-
-            # Remove null values from customer id
-            df = df.dropna(subset=['Customer ID'])
-            
-            # Remove cancelled entries from the dataframe
-            df = df[~df['Invoice'].astype(str).str.startswith('C')]
-            # Remove Quantity and Price with 0
-            df = df[df['Quantity'] > 0]
-            df = df[df['Price']>0]
-            self.final_count = df['Invoice'].count() 
-            self.df = df
+        try:
+            loader = DataLoader(filename, extra_pattern=extra_pattern, max_workers=workers)
+            cache = DatasetCache(loader.sources())
+            if rebuild_cache:
+                # Drop the old copy first, so a failed rebuild cannot leave it behind
+                cache.clear()
+            with stage("load:cache"):
+                cached = cache.load()
+            if cached is not None:
+                df, meta = cached
+                self.initial_count = meta["initial_count"]
+                self.final_count = meta["final_count"]
+                self.df = df
+                print("⚡ Loaded cleaned dataset from cache")
+            else:
+                self._load_and_clean(loader)
+                with stage("load:cache_save"):
+                    cache.save(self.df, self.initial_count, self.final_count)
+            self.dataset_path = cache.data_path
+            with stage("load:cube"):
+                self.cube = self._load_cube(cache, fresh=cached is None)
 
              # Ensure assets folder exists
             os.makedirs("assets", exist_ok=True)
@@ -40,11 +75,110 @@ class Analysis(BaseAnalysis):
             print(f"❌ Error: {ve}. Please verify sheet names or file content.")
             sys.exit(1)
 
-        
+    def _load_cube(self, cache, fresh, cube_dir=".cache/cube"):
+        # The cube is keyed on the cached dataset file, so it is rebuilt
+        # whenever the dataset cache is
+        stat = os.stat(cache.data_path)
+        key = f"{stat.st_size}:{stat.st_mtime_ns}"
+        cube = None if fresh else AggregateCube.load(cube_dir, key)
+        if cube is None:
+            cube = AggregateCube.from_frame(self.df)
+            cube.save(cube_dir, key)
+        return cube
+
+    def _load_streaming(self, path, chunk_size):
+        # Out-of-core mode: the source is folded chunk by chunk into mergeable
+        # aggregates, and self.df only holds a bounded uniform sample
+        try:
+            with stage("load:stream"):
+                partial = StreamingAggregator(path, chunk_size=chunk_size, approximate=self.approximate).run()
+        except FileNotFoundError:
+            print("❌ Error: Data file not found. Please check the filename and path.")
+            sys.exit(1)
+        except ValueError as ve:
+            print(f"❌ Error: {ve}.")
+            sys.exit(1)
+        self._use_partial(partial)
+        print(f"🌊 Streamed {self.initial_count:,} rows from {path}")
+
+    def _load_store(self, store_dir, ingest):
+        # Incremental mode: delta files update only the partitions they touch,
+        # and reports are built from the persisted aggregates
+        store = AggregateStore(store_dir)
+        try:
+            for path in ingest:
+                with stage("load:ingest", path=path):
+                    store.ingest(path)
+        except FileNotFoundError:
+            print("❌ Error: Delta file not found. Please check the filename and path.")
+            sys.exit(1)
+        except ValueError as ve:
+            print(f"❌ Error: {ve}. Please verify the delta file content.")
+            sys.exit(1)
+        with stage("load:store"):
+            partial = store.load()
+        if partial.n == 0:
+            print(f"❌ Error: aggregate store '{store_dir}' is empty. Ingest a file with --ingest first.")
+            sys.exit(1)
+        self._use_partial(partial)
+
+    def _use_partial(self, partial):
+        # The aggregate store keeps exact id sets, so its KPIs are always exact
+        self.approximate = partial.approximate
+        self.initial_count = partial.initial_count
+        self.final_count = partial.final_count
+        self.aggregates = partial.to_aggregates()
+        self.df = partial.sample_frame()
+        os.makedirs("assets", exist_ok=True)
+
+    def _report_generator(self):
+        # ReportLab, and matplotlib/seaborn (see logic.charts), are imported
+        # when a report or chart is first built, so start-up and the menu do
+        # not pay for them
+        if self.report_generator is None:
+            from logic.report_generator import ReportGenerator
+            self.report_generator = ReportGenerator()
+        return self.report_generator
+
+    def _make_processor(self, **chart_options):
+        # chart_options override the renderer options given on the command line
+        renderer = ChartRenderer(cache=self.plot_cache, **dict(self.chart_options, **chart_options))
+        dp = DataProcessor(self.df, renderer=renderer,
+                           approximate=self.approximate, appendices=self.appendices)
+        if self.aggregates is not None:
+            dp.seed_aggregates(self.aggregates)
+        if self.cube is not None:
+            dp.set_cube(self.cube)
+        # A query builds the cube of its own rows when it needs it
+        if self.filters:
+            try:
+                dp = dp.query(**self.filters)
+            except ValueError as ve:
+                print(f"❌ Error: {ve}.")
+                sys.exit(1)
+            # Level 1 reports the rows the query kept
+            self.final_count = dp.df['Invoice'].count()
+        return dp
+
+    def _load_and_clean(self, loader):
+        # Sheets and extra export files are parsed in parallel, reading only
+        # the pipeline's columns with explicit dtypes
+        with stage("load:read_sources"):
+            df = loader.load()
+
+        # initial count of records
+        self.initial_count = df['Invoice'].count()
+
+        # Single-pass cleaning: nulls, cancellations and zero values are
+        # removed with one mask, then columns are stored in compact dtypes
+        with stage("load:clean"):
+            self.df = DataCleaner().clean(df)
+        self.final_count = self.df['Invoice'].count()
+
          
     def _get_user_choice(self):
         print("--------------------------------")
-        dp = DataProcessor(self.df)
+        dp = self._make_processor()
         flag = True
 
         # Print the menu only once at the start
@@ -63,18 +197,18 @@ class Analysis(BaseAnalysis):
                 case "1":
                     # Level 1 report generation
                     report_data = dp._handle_level_1(self.final_count) 
-                    rg = ReportGenerator()
+                    rg = self._report_generator()
                     rg.generate_level_1_report(report_data, "assets/Level1_Report.pdf") 
                     print("✅ Level 1 PDF report generated successfully: Level1_Report.pdf\n")   
                     print("-----------------------------------------------------------------")                 
                 case "2":
-                    rg = ReportGenerator()
+                    rg = self._report_generator()
                     report_data_l1 = dp._handle_level_1(self.final_count)
                     report_data_l2 = dp._handle_level_2()
                     rg.generate_level_2_report(report_data_l1, report_data_l2, "assets/Level2_Report.pdf")
                     print("✅ Level 2 Report generated at assets/Level2_Report.pdf\n")
                 case "3":
-                    rg = ReportGenerator()
+                    rg = self._report_generator()
                     report_data_l1 = dp._handle_level_1(self.final_count)
                     report_data_l2 = dp._handle_level_2()
                     report_data_l3 = dp._handle_level_3()
@@ -82,6 +216,9 @@ class Analysis(BaseAnalysis):
 
                     print("✅ Level 3 Report generated at assets/Level3_Report.pdf\n")
                 case "4" | "q" | "exit":
+                    dp.renderer.shutdown()
+                    if self.plot_cache is not None:
+                        print(self.plot_cache.summary())
                     print("Thank you for using Report Generator. Goodbye!")
                     print("---------------------------------------------")
                     flag = False
@@ -93,11 +230,208 @@ class Analysis(BaseAnalysis):
         print("💰 Welcome to Report Generator 💰", end="\n")
         self._get_user_choice()
 
-if __name__ == "__main__":
-        analysis = Analysis()
-        analysis.run_analysis()
-        
+    def run_batch(self, levels, out_dir):
+        # Non-interactive mode: every requested level is built from one data
+        # load, and each level's data is computed once and shared.
+        # Returns a process exit status.
+        dp = self._make_processor()
+        rg = self._report_generator()
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            report_data_l1 = dp._handle_level_1(self.final_count)
+            report_data_l2 = dp._handle_level_2() if max(levels) >= 2 else None
+            report_data_l3 = dp._handle_level_3() if 3 in levels else None
+
+            # All requested PDFs are written from one set of shared sections
+            outputs = {level: os.path.join(out_dir, f"Level{level}_Report.pdf") for level in levels}
+            rg.generate_reports(outputs, report_data_l1, report_data_l2, report_data_l3)
+            for level, output_file in sorted(outputs.items()):
+                print(f"✅ Level {level} Report generated at {output_file}")
+        except Exception as e:
+            print(f"❌ Error: report generation failed: {e}")
+            return 1
+        finally:
+            dp.renderer.shutdown()
+            if self.plot_cache is not None:
+                print(self.plot_cache.summary())
+        return 0
+
+    def run_by_country(self, levels, out_dir, workers=None):
+        # Fan-out mode: one set of reports per country, built in parallel from
+        # the dataset loaded and cleaned once. Returns a process exit status.
+        from logic.fanout import CountryFanout
+        if self.dataset_path is None:
+            print("❌ Error: --by-country needs the full dataset; it cannot be combined with --stream or --store.")
+            return 1
+        counts = self.df['Country'].value_counts()
+        counts = counts[counts > 0]
+        counts.index = counts.index.astype(str)
+        # Each worker queries its own country; the other filters apply to all
+        filters = dict(self.filters)
+        countries = filters.pop("countries", None)
+        if countries:
+            unknown = [country for country in countries if country not in counts.index]
+            if unknown:
+                print(f"❌ Error: no data for {', '.join(unknown)}.")
+                return 1
+            counts = counts[countries]
+
+        fanout = CountryFanout(self.dataset_path, max_workers=workers,
+                               chart_options=self.chart_options, appendices=self.appendices,
+                               filters=filters, approximate=self.approximate)
+        failed = skipped = 0
+        with stage("fanout", countries=len(counts)):
+            for country, result in fanout.run(counts.to_dict(), levels, out_dir):
+                if result is None:
+                    skipped += 1
+                    print(f"⏭️  {country}: no rows match the filters, skipped")
+                elif isinstance(result, Exception):
+                    failed += 1
+                    print(f"❌ Error: reports for {country} failed: {result}")
+                else:
+                    print(f"✅ {country}: {len(result)} report(s) in {os.path.dirname(result[min(result)])}")
+        built = len(counts) - failed - skipped
+        print(f"🌍 Built reports for {built} of {len(counts)} countries in {out_dir}"
+              + (f" ({skipped} without matching rows)" if skipped else ""))
+        return 1 if failed else 0
+
+    def serve(self, host, port, cache_mb=64):
+        # Service mode: the dataset stays loaded and reports are built on
+        # request. Charts are kept in memory, since responses carry the images.
+        import asyncio
+        from logic.service import ReportService
+        dp = self._make_processor(write_files=False)
+        service = ReportService(dp, self.final_count, cache_bytes=cache_mb * 1024 ** 2)
+        try:
+            asyncio.run(service.serve_forever(host, port))
+        except OSError as e:
+            print(f"❌ Error: cannot listen on {host}:{port}: {e}")
+            return 1
+        except KeyboardInterrupt:
+            print("\nService stopped. Goodbye!")
+        finally:
+            service.shutdown()
+            dp.renderer.shutdown()
+        return 0
 
+def _parse_levels(value):
+    try:
+        levels = {int(level) for level in value.split(",") if level.strip()}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid level list '{value}'")
+    if not levels or not levels <= {1, 2, 3}:
+        raise argparse.ArgumentTypeError("levels must be a comma-separated subset of 1,2,3")
+    return levels
 
-            
-        
\ No newline at end of file
+def _parse_list(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def _parse_ids(value):
+    try:
+        return [int(item) for item in _parse_list(value)]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid customer id list '{value}'")
+
+def _parse_address(value):
+    host, _, port = value.rpartition(":")
+    try:
+        return host or "127.0.0.1", int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid address '{value}', expected HOST:PORT or PORT")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Online Retail II report generator")
+    parser.add_argument("--rebuild-cache", action="store_true",
+                        help="ignore the cached cleaned dataset and re-read the workbook")
+    parser.add_argument("--extra", metavar="GLOB",
+                        help="glob of additional yearly/monthly export files (.xlsx or .csv) to load")
+    parser.add_argument("--workers", type=int,
+                        help="number of processes used to parse sheets and files (default: one per task), "
+                             "or to build --by-country reports (default: one per core)")
+    parser.add_argument("--no-plot-cache", action="store_true",
+                        help="always re-render charts instead of reusing cached images")
+    parser.add_argument("--plot-cache-mb", type=int, default=200,
+                        help="disk budget of the plot cache in MB (default: 200)")
+    parser.add_argument("--stream", metavar="PATH",
+                        help="aggregate a .csv/.parquet source chunk by chunk instead of loading it into memory")
+    parser.add_argument("--chunk-size", type=int, default=500_000,
+                        help="rows per chunk in --stream mode (default: 500000)")
+    parser.add_argument("--store", metavar="DIR",
+                        help="build reports from the persistent aggregate store in DIR")
+    parser.add_argument("--ingest", nargs="+", default=[], metavar="FILE",
+                        help="add delta files (.csv/.parquet/.xlsx) to the aggregate store first")
+    parser.add_argument("--approx", action="store_true",
+                        help="estimate distinct counts and percentiles with HyperLogLog/KLL sketches")
+    parser.add_argument("--levels", type=_parse_levels,
+                        help="build these report levels without the menu, e.g. 1,2,3")
+    parser.add_argument("--out", default="assets",
+                        help="output directory for --levels reports (default: assets)")
+    parser.add_argument("--no-assets", action="store_true",
+                        help="embed charts in the PDFs from memory instead of writing them to assets/")
+    parser.add_argument("--image-format", choices=["png", "jpg"], default="png",
+                        help="chart image format; jpg builds smaller PDFs faster (default: png)")
+    parser.add_argument("--dpi", type=int,
+                        help="chart resolution (default: matplotlib's figure dpi, 100)")
+    parser.add_argument("--by-country", action="store_true",
+                        help="build the --levels reports (default: 1,2,3) for every country, "
+                             "in <out>/<country>/")
+    parser.add_argument("--start", metavar="DATE", help="only report invoices from this date on")
+    parser.add_argument("--end", metavar="DATE", help="only report invoices before this date")
+    parser.add_argument("--countries", type=_parse_list, metavar="LIST",
+                        help="only report these comma-separated countries (with --by-country: "
+                             "build reports for these countries)")
+    parser.add_argument("--stock-codes", type=_parse_list, metavar="LIST",
+                        help="only report these comma-separated stock codes")
+    parser.add_argument("--customers", type=_parse_ids, metavar="LIST",
+                        help="only report these comma-separated customer ids")
+    parser.add_argument("--serve", nargs="?", const="127.0.0.1:8050", type=_parse_address, metavar="HOST:PORT",
+                        help="keep the dataset loaded and serve KPIs, charts and PDFs over HTTP "
+                             "(default: 127.0.0.1:8050)")
+    parser.add_argument("--serve-cache-mb", type=int, default=64,
+                        help="memory budget of the --serve response cache in MB (default: 64)")
+    parser.add_argument("--appendices", action="store_true",
+                        help="end the level-3 report with full-length appendix tables")
+    parser.add_argument("--profile", nargs="?", const="profile_trace.json", metavar="TRACE",
+                        help="time every stage and write a Chrome/Perfetto trace "
+                             "(default file: profile_trace.json)")
+    return parser.parse_args(argv)
+
+def _filters(args):
+    filters = {"start": args.start, "end": args.end, "countries": args.countries,
+               "stock_codes": args.stock_codes, "customers": args.customers}
+    return {name: value for name, value in filters.items() if value is not None}
+
+def _write_profile(path):
+    # Stops profiling, then writes the trace and prints the cost table
+    trace = profiler.disable()
+    trace.write_trace(path)
+    print("⏱️ Profile (inclusive time, most expensive first)")
+    print(trace.summary())
+    print(f"✅ Trace written to {path} (open it in chrome://tracing or ui.perfetto.dev)")
+
+if __name__ == "__main__":
+        args = parse_args()
+        if args.profile:
+            profiler.enable()
+        status = 0
+        try:
+            analysis = Analysis(rebuild_cache=args.rebuild_cache, extra_pattern=args.extra,
+                                workers=args.workers, plot_cache=not args.no_plot_cache,
+                                plot_cache_mb=args.plot_cache_mb, stream_source=args.stream,
+                                chunk_size=args.chunk_size, store_dir=args.store, ingest=args.ingest,
+                                approximate=args.approx, write_assets=not args.no_assets,
+                                image_format=args.image_format, dpi=args.dpi,
+                                appendices=args.appendices, filters=_filters(args))
+            if args.serve:
+                status = analysis.serve(*args.serve, cache_mb=args.serve_cache_mb)
+            elif args.by_country:
+                status = analysis.run_by_country(args.levels or {1, 2, 3}, args.out,
+                                                 workers=args.workers)
+            elif args.levels:
+                status = analysis.run_batch(args.levels, args.out)
+            else:
+                analysis.run_analysis()
+        finally:
+            if args.profile:
+                _write_profile(args.profile)
+        sys.exit(status)
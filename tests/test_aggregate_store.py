@@ -0,0 +1,142 @@
+import os
+import pandas as pd
+import pytest
+from logic.aggregate_store import AggregateStore
+from logic.data_loader import USE_COLUMNS
+
+
+def _line(invoice, date, quantity, price=2.0, customer=1, stock_code="A1", country="France"):
+    return {"Invoice": invoice, "StockCode": stock_code, "Description": f"PRODUCT {stock_code}",
+            "Quantity": quantity, "Price": price, "Customer ID": customer, "Country": country,
+            "InvoiceDate": date}
+
+
+def _delta(path, lines):
+    pd.DataFrame(lines, columns=USE_COLUMNS).to_csv(path, index=False)
+    return str(path)
+
+
+def _cells(store):
+    return store.load().cells.groupby(level='Month')[['Revenue', 'Quantity', 'Lines']].sum()
+
+
+def test_cancellation_nets_out_of_the_sale_month(tmp_path):
+    store = AggregateStore(str(tmp_path / "store"))
+    store.ingest(_delta(tmp_path / "jan.csv", [_line("1", "2011-01-10", 10)]))
+    store.ingest(_delta(tmp_path / "feb.csv", [_line("C2", "2011-02-03", -4),
+                                               _line("3", "2011-02-05", 1, stock_code="B2")]))
+    cells = _cells(store)
+    assert cells.loc["2011-01", "Quantity"] == 6
+    assert cells.loc["2011-01", "Revenue"] == pytest.approx(12.0)
+    # The cancellation is not a line of its own
+    assert cells.loc["2011-01", "Lines"] == 1
+    assert cells.loc["2011-02", "Quantity"] == 1
+
+
+def test_cancellation_ignores_a_later_sale_in_the_same_delta(tmp_path):
+    store = AggregateStore(str(tmp_path / "store"))
+    store.ingest(_delta(tmp_path / "delta.csv", [
+        _line("1", "2011-01-10", 10),
+        _line("C2", "2011-02-03", -4),
+        # Bought again after the cancellation
+        _line("3", "2011-03-07", 5)
+    ]))
+    cells = _cells(store)
+    assert cells.loc["2011-01", "Quantity"] == 6
+    assert cells.loc["2011-03", "Quantity"] == 5
+    assert "2011-02" not in cells.index
+
+
+def test_cancellation_picks_the_latest_earlier_month(tmp_path):
+    store = AggregateStore(str(tmp_path / "store"))
+    store.ingest(_delta(tmp_path / "sales.csv", [_line("1", "2011-01-10", 10),
+                                                 _line("2", "2011-03-01", 10),
+                                                 _line("3", "2011-03-30", 10)]))
+    # After the first March sale but before the second one
+    store.ingest(_delta(tmp_path / "cancel.csv", [_line("C4", "2011-03-15", -3)]))
+    cells = _cells(store)
+    assert cells.loc["2011-01", "Quantity"] == 10
+    assert cells.loc["2011-03", "Quantity"] == 17
+
+
+def test_cancellation_without_an_earlier_sale_is_dropped(tmp_path):
+    store = AggregateStore(str(tmp_path / "store"))
+    store.ingest(_delta(tmp_path / "delta.csv", [_line("C1", "2011-01-05", -4),
+                                                 _line("2", "2011-01-20", 10)]))
+    assert _cells(store).loc["2011-01", "Quantity"] == 10
+
+
+def test_reingesting_a_delta_is_a_no_op(tmp_path):
+    store = AggregateStore(str(tmp_path / "store"))
+    path = _delta(tmp_path / "delta.csv", [_line("1", "2011-01-10", 10), _line("2", "2011-02-10", 3)])
+    assert store.ingest(path) == 2
+    before = _cells(store)
+    assert store.ingest(path) == 0
+    pd.testing.assert_frame_equal(_cells(store), before)
+    assert store.load().final_count == 2
+
+
+def test_failed_ingest_leaves_the_store_unchanged(tmp_path, monkeypatch):
+    root = str(tmp_path / "store")
+    AggregateStore(root).ingest(_delta(tmp_path / "jan.csv", [_line("1", "2011-01-10", 10)]))
+    path = _delta(tmp_path / "more.csv", [_line("2", "2011-01-11", 5), _line("3", "2011-02-10", 3)])
+
+    store = AggregateStore(root)
+
+    def fail(paths):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, "_commit", fail)
+    with pytest.raises(OSError):
+        store.ingest(path)
+
+    # A retry after reopening counts the delta exactly once
+    store = AggregateStore(root)
+    assert not [name for name in os.listdir(root) if name.endswith(".tmp")]
+    assert _cells(store).loc["2011-01", "Quantity"] == 10
+    store.ingest(path)
+    cells = _cells(store)
+    assert cells.loc["2011-01", "Quantity"] == 15
+    assert cells.loc["2011-02", "Quantity"] == 3
+
+
+def test_interrupted_commit_is_completed_on_open(tmp_path, monkeypatch):
+    root = str(tmp_path / "store")
+    path = _delta(tmp_path / "delta.csv", [_line("1", "2011-01-10", 10), _line("2", "2011-02-10", 3)])
+    store = AggregateStore(root)
+
+    def crash():
+        raise OSError("killed")
+
+    # The journal is written, then the process dies before any file is moved
+    monkeypatch.setattr(store, "_recover", crash)
+    with pytest.raises(OSError):
+        store.ingest(path)
+
+    store = AggregateStore(root)
+    assert store.ingest(path) == 0
+    cells = _cells(store)
+    assert cells.loc["2011-01", "Quantity"] == 10
+    assert cells.loc["2011-02", "Quantity"] == 3
+
+
+def test_cancellation_nets_the_cell_with_the_most_recent_sale(tmp_path):
+    store = AggregateStore(str(tmp_path / "store"))
+    # Two cells in January for one customer and StockCode: the second one
+    # was sold first but also most recently
+    store.ingest(_delta(tmp_path / "sales.csv", [
+        _line("1", "2011-01-03", 2, country="Spain"),
+        _line("2", "2011-01-05", 10),
+        _line("3", "2011-01-20", 2, country="Spain")
+    ]))
+    store.ingest(_delta(tmp_path / "cancel.csv", [_line("C4", "2011-01-25", -3, country="Spain"),
+                                                  _line("C5", "2011-01-26", -3, country="Spain")]))
+    cells = store.load().cells.groupby(level='Country')[['Revenue', 'Quantity']].sum()
+    assert cells.loc["France", "Quantity"] == 10
+    # Netted down to nothing, never below
+    assert cells.loc["Spain", "Quantity"] == 0
+    assert cells.loc["Spain", "Revenue"] == pytest.approx(0.0)
+
+    # Nothing is left in that cell for a later cancellation either
+    store.ingest(_delta(tmp_path / "more.csv", [_line("C6", "2011-02-01", -1, country="Spain")]))
+    assert store.load().cells.groupby(level='Country')['Quantity'].sum().loc["Spain"] == 0
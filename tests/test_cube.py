@@ -0,0 +1,82 @@
+import json
+import pandas as pd
+import pytest
+from benchmarks.synthetic import generate
+from logic.cube import AggregateCube
+from logic.data_cleaner import DataCleaner
+from logic.data_processor import DataProcessor
+
+
+@pytest.fixture(scope="module")
+def frame():
+    df = DataCleaner(verbose=False).clean(generate(20_000, countries=8, products=150, customers=600))
+    df['Month'] = df['InvoiceDate'].dt.to_period('M').astype(str)
+    return df
+
+
+def _grouped(df, by, measure):
+    if measure == 'Lines':
+        totals = df.groupby(by, observed=True).size()
+    else:
+        totals = df.groupby(by, observed=True)[measure].sum()
+    if isinstance(totals.index, pd.MultiIndex):
+        totals.index = totals.index.set_levels([level.astype(str) for level in totals.index.levels])
+    else:
+        totals.index = totals.index.astype(str)
+    return totals
+
+
+@pytest.mark.parametrize("by", ['Month', 'Country', 'Description', ['Month', 'Country'],
+                                ['Country', 'Description'], ['Month', 'Country', 'Description']])
+@pytest.mark.parametrize("measure", ['Revenue', 'Quantity', 'Lines'])
+def test_rollups_match_groupbys(frame, by, measure):
+    cube = AggregateCube.from_frame(frame)
+    expected = _grouped(frame, by, measure)
+    result = cube.rollup(by, measure)
+    assert len(result) == len(expected)
+    pd.testing.assert_series_equal(result.astype(float), expected.reindex(result.index).astype(float),
+                                   check_names=False)
+
+
+def test_totals_match_rows(frame):
+    cube = AggregateCube.from_frame(frame)
+    assert cube.total('Revenue') == pytest.approx(frame['Revenue'].sum())
+    assert cube.total('Lines') == len(frame)
+    assert cube.total('Quantity') == frame['Quantity'].sum()
+
+
+def test_kpis_count_invoices_spanning_months_once(frame):
+    # The same invoice number in two months and two countries
+    df = frame.copy()
+    df['Invoice'] = df['Invoice'].astype(str)
+    df.loc[df.index[:2], 'Invoice'] = "X1"
+    df.loc[df.index[0], 'InvoiceDate'] = pd.Timestamp("2010-01-05")
+    df.loc[df.index[1], 'InvoiceDate'] = pd.Timestamp("2011-06-05")
+    df.loc[df.index[1], 'Country'] = df['Country'].iloc[-1]
+    kpis = DataProcessor(df).aggregate("kpi_values")
+    assert kpis["total_transactions"] == df['Invoice'].nunique()
+
+
+def test_save_load_round_trip(frame, tmp_path):
+    cube = AggregateCube.from_frame(frame)
+    cube.save(str(tmp_path / "cube"), key="v1")
+    loaded = AggregateCube.load(str(tmp_path / "cube"), key="v1")
+    assert len(loaded) == len(cube)
+    for by in ['Month', 'Country', ['Month', 'Description']]:
+        for measure in ['Revenue', 'Quantity', 'Lines']:
+            pd.testing.assert_series_equal(loaded.rollup(by, measure), cube.rollup(by, measure))
+
+
+def test_load_of_a_stale_or_missing_cube_is_none(frame, tmp_path):
+    AggregateCube.from_frame(frame).save(str(tmp_path / "cube"), key="v1")
+    assert AggregateCube.load(str(tmp_path / "cube"), key="v2") is None
+    assert AggregateCube.load(str(tmp_path / "missing"), key="v1") is None
+
+
+def test_load_of_an_older_format_is_none(frame, tmp_path):
+    # Version 1 cubes also held invoice counts
+    path = tmp_path / "cube"
+    AggregateCube.from_frame(frame).save(str(path), key="v1")
+    header = json.loads((path / "cube.json").read_text())
+    (path / "cube.json").write_text(json.dumps({**header, "version": 1}))
+    assert AggregateCube.load(str(path), key="v1") is None
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import generate
+from logic.data_cleaner import DataCleaner
+from logic.data_processor import DataProcessor, EmptyQuery, _KeyIndex
+
+
+@pytest.fixture(scope="module")
+def frame():
+    df = DataCleaner(verbose=False).clean(generate(20_000, countries=12, products=300, customers=800))
+    # Original positions, to compare query results with boolean masks
+    df['RowId'] = np.arange(len(df))
+    return df
+
+
+def _selected(dp):
+    return np.sort(dp.df['RowId'].to_numpy())
+
+
+def test_key_index_rows_match_masks():
+    rng = np.random.default_rng(0)
+    # -1 marks missing values, which belong to no key
+    codes = rng.integers(-1, 20, 5_000)
+    index = _KeyIndex(codes, [f"k{i}" for i in range(20)])
+    for lo, hi in [(0, 5_000), (1_000, 1_001), (1_234, 4_321), (3_000, 3_000)]:
+        for wanted in [[3], [0, 7, 19], list(range(20)), []]:
+            selected = index.lookup([f"k{i}" for i in wanted])
+            mask = np.isin(codes, wanted)
+            mask[:lo] = mask[hi:] = False
+            np.testing.assert_array_equal(index.rows(selected, lo, hi), np.flatnonzero(mask))
+            assert index.count(selected, lo, hi) == mask.sum()
+
+
+def test_key_index_contains_matches_mask():
+    rng = np.random.default_rng(1)
+    codes = rng.integers(-1, 10, 1_000)
+    index = _KeyIndex(codes, list("abcdefghij"))
+    rows = rng.choice(1_000, 300, replace=False)
+    selected = index.lookup(["b", "e", "zz"])
+    np.testing.assert_array_equal(index.contains(selected, rows), np.isin(codes[rows], [1, 4]))
+
+
+def test_key_index_lookup_ignores_unknown_values():
+    index = _KeyIndex(np.array([0, 1, 1, 2]), ["a", "b", "c"])
+    np.testing.assert_array_equal(index.lookup(["c", "missing", "a", "c"]), [0, 2])
+
+
+def test_query_matches_boolean_masks(frame):
+    dp = DataProcessor(frame)
+    countries = list(frame['Country'].value_counts().index[[1, 4]].astype(str))
+    stock_codes = list(frame['StockCode'].cat.categories[:40])
+    customers = list(frame['Customer ID'].unique()[:200])
+    start, end = pd.Timestamp("2010-03-01"), pd.Timestamp("2011-02-15")
+    in_range = (frame['InvoiceDate'] >= start) & (frame['InvoiceDate'] < end)
+    cases = [
+        ({"start": start, "end": end}, in_range),
+        ({"countries": countries}, frame['Country'].isin(countries)),
+        ({"start": start, "countries": countries, "stock_codes": stock_codes},
+         (frame['InvoiceDate'] >= start) & frame['Country'].isin(countries) & frame['StockCode'].isin(stock_codes)),
+        ({"end": end, "customers": customers, "countries": countries},
+         (frame['InvoiceDate'] < end) & frame['Customer ID'].isin(customers) & frame['Country'].isin(countries)),
+    ]
+    for filters, mask in cases:
+        result = dp.query(**filters)
+        np.testing.assert_array_equal(_selected(result), np.flatnonzero(mask.to_numpy()))
+        # Rows come back in date order
+        assert result.df['InvoiceDate'].is_monotonic_increasing
+
+
+def test_query_with_no_matching_rows_raises(frame):
+    dp = DataProcessor(frame)
+    with pytest.raises(EmptyQuery):
+        dp.query(start="2030-01-01")
+    with pytest.raises(EmptyQuery):
+        dp.query(countries=["Atlantis"])
+
+
+def test_query_needs_row_level_data(frame):
+    dp = DataProcessor(frame)
+    dp.seed_aggregates({"kpi_values": {}})
+    with pytest.raises(ValueError):
+        dp.query(countries=["France"])
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+from logic.sketches import HyperLogLog, KLLSketch, build_sketches, merge_sketches
+
+
+def _rank(values, x):
+    return np.mean(values <= x)
+
+
+@pytest.mark.parametrize("n", [100, 5_000, 200_000])
+def test_hll_count_is_within_three_standard_errors(n):
+    sketch = HyperLogLog().update(np.arange(n, dtype=np.int64))
+    assert abs(sketch.count() - n) <= 3 * sketch.relative_error() * n
+
+
+def test_hll_ignores_repeats():
+    values = np.arange(10_000, dtype=np.int64)
+    once = HyperLogLog().update(values)
+    repeated = HyperLogLog().update(np.concatenate([values, values, values[:500]]))
+    np.testing.assert_array_equal(once.registers, repeated.registers)
+
+
+def test_hll_merge_equals_sketch_of_union():
+    left = np.arange(0, 60_000, dtype=np.int64)
+    right = np.arange(40_000, 100_000, dtype=np.int64)
+    merged = HyperLogLog().update(left).merge(HyperLogLog().update(right))
+    union = HyperLogLog().update(np.concatenate([left, right]))
+    np.testing.assert_array_equal(merged.registers, union.registers)
+
+
+def test_hll_merge_needs_same_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(p=12).merge(HyperLogLog(p=14))
+
+
+def test_hll_bytes_round_trip():
+    sketch = HyperLogLog(p=10).update(np.arange(1_000, dtype=np.int64))
+    restored = HyperLogLog.from_bytes(sketch.to_bytes())
+    assert restored.p == 10
+    assert restored.count() == sketch.count()
+
+
+@pytest.mark.parametrize("q", [0.01, 0.5, 0.99])
+def test_kll_quantile_is_within_rank_error(q):
+    values = np.random.default_rng(0).lognormal(3, 1.5, 500_000)
+    sketch = KLLSketch(seed=1).update(values)
+    assert sketch.count() == len(values)
+    assert abs(_rank(values, sketch.quantile(q)) - q) <= sketch.rank_error()
+
+
+def test_kll_merge_is_within_rank_error():
+    rng = np.random.default_rng(2)
+    parts = [rng.exponential(50, 100_000) for _ in range(4)]
+    merged = KLLSketch(seed=0)
+    for i, part in enumerate(parts):
+        merged.merge(KLLSketch(seed=i).update(part))
+    values = np.concatenate(parts)
+    assert merged.count() == len(values)
+    assert abs(_rank(values, merged.quantile(0.99)) - 0.99) <= merged.rank_error()
+
+
+def test_kll_ignores_nan_and_handles_empty():
+    assert np.isnan(KLLSketch().quantile(0.5))
+    sketch = KLLSketch().update([1.0, np.nan, 3.0, 2.0])
+    assert sketch.count() == 3
+    assert sketch.quantile(0.5) == 2.0
+
+
+def test_kll_bytes_round_trip():
+    sketch = KLLSketch(seed=0).update(np.arange(100_000, dtype=np.float64))
+    restored = KLLSketch.from_bytes(sketch.to_bytes())
+    assert restored.count() == sketch.count()
+    assert restored.quantile(0.9) == sketch.quantile(0.9)
+
+
+def test_sketches_of_categorical_and_plain_chunks_merge():
+    # Cleaned frames hold categoricals, raw chunks plain strings: the same
+    # ids must land in the same registers either way
+    frame = pd.DataFrame({
+        "Invoice": [str(i // 3) for i in range(3_000)],
+        "Customer ID": np.arange(3_000) % 700,
+        "Revenue": np.linspace(1, 100, 3_000)
+    })
+    plain = build_sketches(frame)
+    categorical = build_sketches(frame.astype({"Invoice": "category"}))
+    np.testing.assert_array_equal(plain["invoices"].registers, categorical["invoices"].registers)
+    assert abs(plain["invoices"].count() - 1_000) <= 3 * plain["invoices"].relative_error() * 1_000
+
+    merged = merge_sketches(build_sketches(frame.iloc[:1_500]),
+                            build_sketches(frame.iloc[1_500:].astype({"Invoice": "category"})))
+    np.testing.assert_array_equal(merged["invoices"].registers, plain["invoices"].registers)
+    np.testing.assert_array_equal(merged["customers"].registers, plain["customers"].registers)
@@ -0,0 +1,35 @@
+import io
+import pandas as pd
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import SimpleDocTemplate
+from logic.tables import BOLD_FONT, ELLIPSIS, FONT, H_PADDING, dataframe_table
+
+
+def test_row_wider_than_the_frame_is_clipped_to_its_columns():
+    df = pd.DataFrame({
+        "Description": ["WHITE HANGING HEART T-LIGHT HOLDER " * 4, "MUG"],
+        "Country": ["United Kingdom " * 6, "EIRE"],
+        "A very long column header that cannot fit": [1, 2]
+    })
+    table = dataframe_table(df, font_size=8, available_width=200)
+    assert sum(table.widths) <= 200 + 1e-6
+    for j, width in enumerate(table.widths):
+        room = width - 2 * H_PADDING
+        assert stringWidth(table.header[j], BOLD_FONT, 8) <= room
+        for value in table.rows[:, j]:
+            assert stringWidth(value, FONT, 8) <= room
+    assert table.rows[0, 0].endswith(ELLIPSIS)
+    assert table.rows[0, 0].startswith("WHITE")
+    # Text that fits is left as it is
+    assert list(table.rows[1]) == ["MUG", "EIRE", "2"]
+
+    # The clipped table still lays out and draws
+    SimpleDocTemplate(io.BytesIO(), pagesize=A4).build([table])
+
+
+def test_table_that_fits_is_not_clipped():
+    df = pd.DataFrame({"Country": ["France", "Germany"], "Revenue": [1234.5, 99.0]})
+    table = dataframe_table(df)
+    assert table.header == ["Country", "Revenue"]
+    assert list(table.rows[:, 1]) == ["1,234.50", "99.00"]